@@ -1,23 +1,25 @@
 # python_service/app.py
-from flask import Flask, request, jsonify
-import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import nltk
+from flask import Flask, request, jsonify, g
 import os
-import json
-import re
+import time
 from flask_cors import CORS
 import traceback
-from web3 import Web3  # Import Web3 for contract interaction
 import threading
+import atexit
 from datetime import datetime
+from corpus_index import CorpusIndex
+from similarity_engine import SimilarityEngine, pairwise_similarity
+from lsh_index import MinHashLSH
+from fingerprint_index import FingerprintIndex
+from paper_store import PaperStore
+from text_processing import TextPipeline
+from chain_client import ChainClient, ChainUnavailable, load_contract_artifact
+from registry_index import RegistryIndex
+from check_state import CheckLogWriter, CheckLimitStore
+from metrics import Metrics
+from warm_snapshot import WarmSnapshot, stale_buckets
 
 
-nltk.download('punkt')
-nltk.download('stopwords')
-CHECK_LIMITS = {}
-check_limits_lock = threading.Lock()
 app = Flask(__name__)
 CORS(app, resources={
     r"/api/*": {
@@ -27,28 +29,365 @@ CORS(app, resources={
     }
 })
 
-PAPERS_DIR = os.path.join(os.path.dirname(__file__), 'papers')
+METRICS = Metrics()
+
+def timed(stage):
+    # Per-stage latency, labelled with the endpoint being served
+    return METRICS.stage(request.endpoint or "unknown", stage)
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_time(response):
+    started = g.get('request_started')
+    if started is not None:
+        METRICS.requests.observe(
+            time.perf_counter() - started, request.endpoint or "unknown", request.method, str(response.status_code)
+        )
+    return response
+
+# Legacy per-paper JSON files; imported into PAPER_DB_PATH on startup
+PAPERS_DIR = os.environ.get('PAPERS_DIR', os.path.join(os.path.dirname(__file__), 'papers'))
 os.makedirs(PAPERS_DIR, exist_ok=True)
+PAPER_DB_PATH = os.environ.get('PAPER_DB_PATH', os.path.join(os.path.dirname(__file__), 'papers.db'))
+PAPER_STORE = PaperStore(PAPER_DB_PATH, snapshot_interval=int(os.environ.get('PAPER_SNAPSHOT_INTERVAL', 16)))
+
+INDEX_DIR = os.environ.get('INDEX_DIR', os.path.join(os.path.dirname(__file__), 'indexes'))
+LSH_INDEX_PATH = os.path.join(INDEX_DIR, 'lsh_signatures.npz')
+# Prebuilt corpus/TF-IDF/fingerprint indexes, loaded instead of re-indexing the store
+WARM_SNAPSHOT_DIR = os.path.join(INDEX_DIR, 'warm')
+WARM_SNAPSHOT_INTERVAL = float(os.environ.get('WARM_SNAPSHOT_INTERVAL', 300))
+# How often each worker looks for papers stored by the other workers
+STORE_POLL_INTERVAL = float(os.environ.get('STORE_POLL_INTERVAL', 2))
+# Index in a background thread and report progress on /api/ready
+WARMUP_IN_BACKGROUND = os.environ.get('WARMUP_IN_BACKGROUND', 'true').lower() == 'true'
+# Never reach for the network for NLTK data (vendored under nltk_data/)
+OFFLINE_MODE = os.environ.get('OFFLINE_MODE', 'false').lower() == 'true'
+
+PLAGIARISM_THRESHOLD = 30
+# Share of a submission (percent) copied verbatim from one paper that makes it not original;
+# shorter overlaps such as citations and quotations are only reported
+COPIED_PERCENT_THRESHOLD = float(os.environ.get('COPIED_PERCENT_THRESHOLD', 40))
+MAX_CHECKS_PER_PAPER = 3
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 500))
+# Batches smaller than this are tokenized in-process; pool start-up would dominate
+BATCH_POOL_MIN_SIZE = int(os.environ.get('BATCH_POOL_MIN_SIZE', 16))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', 0)) or None
+SIMILAR_PAPERS_TOP_K = int(os.environ.get('SIMILAR_PAPERS_TOP_K', 5))
+# Below this many papers an exact scan is cheaper than candidate retrieval
+LSH_MIN_CORPUS = int(os.environ.get('LSH_MIN_CORPUS', 5000))
+LSH_MAX_CANDIDATES = int(os.environ.get('LSH_MAX_CANDIDATES', 200))
+# Token-overlap candidates catch edited copies that LSH shingles miss
+TOKEN_MAX_CANDIDATES = int(os.environ.get('TOKEN_MAX_CANDIDATES', 200))
+TOKEN_CANDIDATE_LOOKUPS = int(os.environ.get('TOKEN_CANDIDATE_LOOKUPS', 64))
+
+# Check counters are shared by every worker process through SQLite shards
+CHECK_LIMITS_DIR = os.environ.get('CHECK_LIMITS_DIR', os.path.join(os.path.dirname(__file__), 'check_limits'))
+CHECK_LIMITS = CheckLimitStore(CHECK_LIMITS_DIR, shards=int(os.environ.get('CHECK_LIMIT_SHARDS', 8)))
+CHECK_LOG_DIR = os.environ.get('CHECK_LOG_DIR', os.path.join(os.path.dirname(__file__), 'check_logs'))
+CHECK_LOG = CheckLogWriter(CHECK_LOG_DIR, flush_interval=float(os.environ.get('CHECK_LOG_FLUSH_INTERVAL', 1)))
+CHECK_LOG.start()
+atexit.register(CHECK_LOG.flush)
+
+TEXT_PIPELINE = TextPipeline(
+    cache_tokens=int(os.environ.get('PREPROCESS_CACHE_TOKENS', 1000000)),
+    offline=OFFLINE_MODE
+)
 
 def preprocess_text(text):
-    text = text.lower()
-    text = re.sub(r'[^\w\s]', '', text)
-    text = re.sub(r'\d+', '', text)
-    tokens = nltk.word_tokenize(text)
-    stop_words = set(nltk.corpus.stopwords.words('english'))
-    tokens = [token for token in tokens if token not in stop_words]
-    return ' '.join(tokens)
-
-def calculate_similarity(text1, text2):
-    processed_text1 = preprocess_text(text1)
-    processed_text2 = preprocess_text(text2)
-    vectorizer = TfidfVectorizer()
+    return TEXT_PIPELINE.process(text)
+
+_preprocess_pool = None
+_preprocess_pool_lock = threading.Lock()
+
+def get_preprocess_pool():
+    global _preprocess_pool
+    with _preprocess_pool_lock:
+        if _preprocess_pool is None:
+            _preprocess_pool = TEXT_PIPELINE.create_pool(BATCH_WORKERS)
+            atexit.register(_preprocess_pool.shutdown, wait=False)
+        return _preprocess_pool
+
+CORPUS_INDEX = CorpusIndex()
+SIMILARITY_ENGINE = SimilarityEngine(
+    refit_threshold=int(os.environ.get('SIMILARITY_REFIT_THRESHOLD', 50)),
+    refit_interval=float(os.environ.get('SIMILARITY_REFIT_INTERVAL', 30))
+)
+LSH_INDEX = MinHashLSH(
+    num_perm=int(os.environ.get('LSH_NUM_PERM', 128)),
+    bands=int(os.environ.get('LSH_BANDS', 64)),
+    shingle_size=int(os.environ.get('LSH_SHINGLE_SIZE', 3))
+)
+FINGERPRINT_INDEX = FingerprintIndex(
+    kgram=int(os.environ.get('FINGERPRINT_KGRAM', 40)),
+    window=int(os.environ.get('FINGERPRINT_WINDOW', 20)),
+    min_match_chars=int(os.environ.get('FINGERPRINT_MIN_MATCH_CHARS', 100))
+)
+
+def index_paper(bucket_hash, title, author_address, content, version_index):
+    CORPUS_INDEX.upsert(bucket_hash, title, author_address, ())
+    index_version(bucket_hash, content, version_index)
+
+# bucket_hash -> number of versions reflected in the in-memory indexes
+INDEXED_VERSIONS = {}
+indexed_versions_lock = threading.Lock()
+
+def index_version(bucket_hash, content, version_index):
+    tokens = TEXT_PIPELINE.tokens(content)
+    processed = ' '.join(tokens)
+    CORPUS_INDEX.update_content(bucket_hash, tokens)
+    SIMILARITY_ENGINE.upsert(bucket_hash, processed)
+    FINGERPRINT_INDEX.upsert(bucket_hash, content)
+    if (bucket_hash, version_index) not in LSH_INDEX:
+        LSH_INDEX.add(bucket_hash, version_index, tokens)
+    with indexed_versions_lock:
+        INDEXED_VERSIONS[bucket_hash] = max(INDEXED_VERSIONS.get(bucket_hash, 0), version_index + 1)
+
+def load_paper(bucket_hash):
+    return PAPER_STORE.get_paper(bucket_hash, start=-1)
+
+def index_stored_paper(paper):
+    bucket_hash = paper["bucket_hash"]
+    latest_index = paper["version_count"] - 1
+    index_paper(bucket_hash, paper["title"], paper["author_address"], paper["content"], latest_index)
+    # Only versions missing from the persisted signatures need hashing
+    if all((bucket_hash, version_index) in LSH_INDEX for version_index in range(latest_index)):
+        return
+    for version in PAPER_STORE.get_versions(bucket_hash, 0, latest_index):
+        if (bucket_hash, version["version_index"]) not in LSH_INDEX:
+            LSH_INDEX.add(bucket_hash, version["version_index"], TEXT_PIPELINE.tokens(version["content"]))
+
+WARM_SNAPSHOT = WarmSnapshot(WARM_SNAPSHOT_DIR)
+
+def save_warm_snapshot():
+    # Taken before the indexes are copied: papers indexed meanwhile are re-indexed on the next start
+    with indexed_versions_lock:
+        watermark = dict(INDEXED_VERSIONS)
+    return WARM_SNAPSHOT.save(watermark, SIMILARITY_ENGINE, CORPUS_INDEX, FINGERPRINT_INDEX)
+
+def load_warm_snapshot():
+    # Returns the snapshot watermark, or None if there is no usable snapshot
+    watermark = WARM_SNAPSHOT.load(SIMILARITY_ENGINE, CORPUS_INDEX, FINGERPRINT_INDEX)
+    if watermark is None:
+        return None
+    with indexed_versions_lock:
+        for bucket_hash, count in watermark.items():
+            INDEXED_VERSIONS[bucket_hash] = max(INDEXED_VERSIONS.get(bucket_hash, 0), count)
+    return watermark
+
+def load_corpus():
+    migrated = PAPER_STORE.migrate_json_dir(PAPERS_DIR)
+    if migrated:
+        print(f"Migrated {migrated} papers from {PAPERS_DIR} into {PAPER_DB_PATH}")
+    try:
+        print(f"Loaded {LSH_INDEX.load(LSH_INDEX_PATH)} LSH signatures from {LSH_INDEX_PATH}")
+    except Exception as e:
+        # Missing signatures are recomputed while indexing below
+        print(f"Warning: Could not load LSH signatures: {str(e)}")
+    watermark = load_warm_snapshot()
+    stale = []
+    if watermark is None:
+        for paper in PAPER_STORE.iter_latest():
+            index_stored_paper(paper)
+        SIMILARITY_ENGINE.refit()
+        WARMUP["source"] = "store"
+    else:
+        # Only papers changed since the snapshot are read back from the store
+        stale = stale_buckets(watermark, PAPER_STORE.version_counts())
+        for bucket_hash in stale:
+            index_stored_paper(dict(load_paper(bucket_hash), bucket_hash=bucket_hash))
+        if not SIMILARITY_ENGINE.fitted():
+            # Saved before the first TF-IDF fit; don't report ready with an empty engine
+            SIMILARITY_ENGINE.refit()
+        print(f"Loaded warm snapshot of {len(watermark)} papers, re-indexed {len(stale)}")
+        WARMUP["source"] = "snapshot"
+    SIMILARITY_ENGINE.start()
+    try:
+        LSH_INDEX.save(LSH_INDEX_PATH)
+    except Exception as e:
+        print(f"Warning: Failed to save LSH signatures: {str(e)}")
+    LSH_INDEX.start_autosave(LSH_INDEX_PATH, float(os.environ.get('LSH_SAVE_INTERVAL', 60)))
+    atexit.register(LSH_INDEX.save, LSH_INDEX_PATH)
+    if watermark is None or stale:
+        try:
+            save_warm_snapshot()
+        except Exception as e:
+            # The indexes are built; a missing snapshot only makes the next start slower
+            print(f"Warning: Failed to save warm snapshot: {str(e)}")
+    start_snapshot_autosave(WARM_SNAPSHOT_INTERVAL)
+    start_store_follower(STORE_POLL_INTERVAL)
+    print(f"Indexed {len(CORPUS_INDEX)} papers from {PAPER_DB_PATH}")
+
+def index_stale_papers():
+    # Re-index papers whose stored versions are ahead of INDEXED_VERSIONS; returns how many
+    with indexed_versions_lock:
+        indexed = dict(INDEXED_VERSIONS)
+    stale = stale_buckets(indexed, PAPER_STORE.version_counts())
+    for bucket_hash in stale:
+        paper = load_paper(bucket_hash)
+        if paper is not None:
+            index_stored_paper(dict(paper, bucket_hash=bucket_hash))
+    return len(stale)
+
+def start_store_follower(interval):
+    # Writes are indexed directly only by the worker that made them; pick up the others' here
+    def follow():
+        seen = None
+        while True:
+            time.sleep(interval)
+            try:
+                data_version = PAPER_STORE.data_version()
+                if data_version == seen:
+                    continue
+                seen = data_version
+                index_stale_papers()
+            except Exception as e:
+                print(f"Warning: Failed to index papers from other workers: {str(e)}")
+
+    threading.Thread(target=follow, name="store-follower", daemon=True).start()
+
+def start_snapshot_autosave(interval):
+    def autosave():
+        with indexed_versions_lock:
+            saved = dict(INDEXED_VERSIONS)
+        while True:
+            time.sleep(interval)
+            with indexed_versions_lock:
+                current = dict(INDEXED_VERSIONS)
+            if current == saved:
+                continue
+            try:
+                save_warm_snapshot()
+                saved = current
+            except Exception as e:
+                print(f"Warning: Failed to save warm snapshot: {str(e)}")
+
+    threading.Thread(target=autosave, name="warm-snapshot-autosave", daemon=True).start()
+
+BUILD_CONTRACTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'build', 'contracts')
+CHAIN_CLIENT = None
+RECORD_QUEUE = None
+
+# Local mirror of AcademicPaperRegistry; readable even when the node is down
+REGISTRY_DB_PATH = os.environ.get('REGISTRY_DB_PATH', os.path.join(os.path.dirname(__file__), 'registry.db'))
+REGISTRY_PAGE_LIMIT = int(os.environ.get('REGISTRY_PAGE_LIMIT', 500))
+REGISTRY_INDEX = RegistryIndex(
+    REGISTRY_DB_PATH,
+    start_block=int(os.environ.get('REGISTRY_START_BLOCK', 0)),
+    batch_blocks=int(os.environ.get('REGISTRY_BATCH_BLOCKS', 2000)),
+    confirmations=int(os.environ.get('REGISTRY_CONFIRMATIONS', 0)),
+    store_db_path=PAPER_DB_PATH
+)
+
+# Receipts are shared by all workers; one of them sends the transactions
+RECORD_QUEUE_DB_PATH = os.environ.get(
+    'RECORD_QUEUE_DB_PATH', os.path.join(os.path.dirname(__file__), 'record_queue.db')
+)
+
+def connect_chain():
+    global CHAIN_CLIENT, RECORD_QUEUE
+    try:
+        CHAIN_CLIENT = ChainClient(
+            os.environ.get('ETH_RPC_URL', 'http://localhost:8545'),
+            os.environ.get('CHECKER_ARTIFACT_PATH', os.path.join(BUILD_CONTRACTS_DIR, 'PlagiarismChecker.json')),
+            contract_address=os.environ.get('PLAGIARISM_CHECKER_ADDRESS', "0x477d1a04263C98ECC5b4482D2FE24fA6f5D59a5D"),
+            pool_size=int(os.environ.get('ETH_RPC_POOL_SIZE', 10)),
+            state_ttl=float(os.environ.get('AUTHOR_STATE_TTL', 10))
+        )
+        CHAIN_CLIENT.start_event_listener(float(os.environ.get('CHAIN_EVENT_POLL_INTERVAL', 2)))
+    except Exception as e:
+        print(f"Warning: Blockchain client disabled: {str(e)}")
+        CHAIN_CLIENT = None
+        return
+
+    # recordCheck transactions are only sent when a sender is configured or explicitly enabled
+    private_key = os.environ.get('CHECKER_PRIVATE_KEY')
+    sender_address = os.environ.get('CHECKER_SENDER_ADDRESS')
+    if private_key or sender_address or os.environ.get('RECORD_CHECKS_ON_CHAIN', 'false').lower() == 'true':
+        try:
+            from record_queue import RecordCheckQueue
+            RECORD_QUEUE = RecordCheckQueue(
+                CHAIN_CLIENT,
+                RECORD_QUEUE_DB_PATH,
+                sender=sender_address,
+                private_key=private_key,
+                batch_size=int(os.environ.get('RECORD_BATCH_SIZE', 16)),
+                max_attempts=int(os.environ.get('RECORD_MAX_ATTEMPTS', 5)),
+                backoff=float(os.environ.get('RECORD_RETRY_BACKOFF', 2)),
+                confirm_timeout=float(os.environ.get('RECORD_CONFIRM_TIMEOUT', 600))
+            )
+            RECORD_QUEUE.start()
+        except Exception as e:
+            print(f"Warning: recordCheck queue disabled: {str(e)}")
+            RECORD_QUEUE = None
+
     try:
-        tfidf_matrix = vectorizer.fit_transform([processed_text1, processed_text2])
-        similarity = cosine_similarity(tfidf_matrix[0:1], tfidf_matrix[1:2])[0][0]
-        return float(similarity * 100)
-    except:
-        return 0.0
+        registry_abi, registry_address = load_contract_artifact(
+            os.environ.get('REGISTRY_ARTIFACT_PATH', os.path.join(BUILD_CONTRACTS_DIR, 'AcademicPaperRegistry.json')),
+            os.environ.get('ACADEMIC_PAPER_REGISTRY_ADDRESS', "0xfB80dAeB8A56f347051e49b78B6470D0DCF07D6e")
+        )
+        REGISTRY_INDEX.attach(
+            CHAIN_CLIENT.w3.eth.contract(address=CHAIN_CLIENT.w3.to_checksum_address(registry_address), abi=registry_abi),
+            CHAIN_CLIENT
+        )
+        REGISTRY_INDEX.start(float(os.environ.get('REGISTRY_POLL_INTERVAL', 5)))
+    except Exception as e:
+        print(f"Warning: Registry indexer disabled: {str(e)}")
+
+WARMUP = {"ready": False, "stage": "starting", "source": None, "error": None, "seconds": None}
+
+def warm_up():
+    started = time.monotonic()
+    try:
+        WARMUP["stage"] = "indexes"
+        load_corpus()
+        WARMUP["stage"] = "blockchain"
+        connect_chain()
+        WARMUP["stage"] = "done"
+        WARMUP["ready"] = True
+    except Exception as e:
+        traceback.print_exc()
+        WARMUP["stage"] = "failed"
+        WARMUP["error"] = str(e)
+    WARMUP["seconds"] = round(time.monotonic() - started, 3)
+    print(f"Warm-up {WARMUP['stage']} after {WARMUP['seconds']}s")
+
+def not_ready():
+    # Response for endpoints that need the indexes while warm-up is running
+    return jsonify({
+        "error": "Service is warming up",
+        "stage": WARMUP["stage"],
+        "details": WARMUP["error"]
+    }), 503
+
+if __name__ == '__mp_main__':
+    # Re-imported by a preprocessing pool worker (python app.py); it only tokenizes
+    pass
+elif WARMUP_IN_BACKGROUND:
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+else:
+    warm_up()
+
+METRICS.gauge("plagiarism_indexed_papers", "Papers in the in-memory indexes.", lambda: len(CORPUS_INDEX))
+METRICS.gauge("plagiarism_lsh_signatures", "Version signatures in the LSH index.", lambda: len(LSH_INDEX))
+METRICS.counter("plagiarism_preprocess_cache_hits_total", "Token cache hits.", lambda: TEXT_PIPELINE.hits)
+METRICS.counter("plagiarism_preprocess_cache_misses_total", "Token cache misses.", lambda: TEXT_PIPELINE.misses)
+METRICS.gauge("plagiarism_ready", "1 once warm-up has finished.", lambda: WARMUP["ready"])
+METRICS.gauge(
+    "plagiarism_chain_circuit_open", "1 while calls to the Ethereum node are short-circuited.",
+    lambda: CHAIN_CLIENT is not None and CHAIN_CLIENT.breaker.state == "open"
+)
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return METRICS.render(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
+@app.route('/api/ready', methods=['GET'])
+def ready():
+    status = dict(WARMUP, papers=len(CORPUS_INDEX))
+    return jsonify(status), 200 if WARMUP["ready"] else 503
 
 @app.route('/api/store_paper', methods=['POST'])
 def store_paper():
@@ -62,48 +401,34 @@ def store_paper():
     if not all([bucket_hash, content, title, author_address]):
         return jsonify({"error": "Missing required fields"}), 400
 
-    paper_path = os.path.join(PAPERS_DIR, f"{bucket_hash}.json")
-
-    if os.path.exists(paper_path):
-        with open(paper_path, 'r') as f:
-            paper_data = json.load(f)
-        paper_data["versions"].append({
-            "content": content,
-            "timestamp": timestamp
-        })
-        if paper_data.get("author_address") != author_address:
-            paper_data["author_address"] = author_address + " (shared)"
+    version_index, stored_author = PAPER_STORE.store_paper(bucket_hash, title, content, author_address, timestamp)
+    if version_index == 0:
+        index_paper(bucket_hash, title, stored_author, content, version_index)
     else:
-        paper_data = {
-            "bucket_hash": bucket_hash,
-            "title": title,
-            "content": content,
-            "author_address": author_address,
-            "versions": [
-                {
-                    "content": content,
-                    "timestamp": timestamp
-                }
-            ]
-        }
-
-    with open(paper_path, 'w') as f:
-        json.dump(paper_data, f, indent=2)
+        CORPUS_INDEX.set_author(bucket_hash, stored_author)
+        index_version(bucket_hash, content, version_index)
 
     return jsonify({"success": True, "message": "Paper stored successfully"})
 
 @app.route('/api/get_paper_content/<bucket_hash>', methods=['GET'])
 def get_paper_content(bucket_hash):
-    paper_path = os.path.join(PAPERS_DIR, f"{bucket_hash}.json")
-    if not os.path.exists(paper_path):
+    # ?latest=true returns only the newest version, ?start=&end= a slice of versions
+    try:
+        if request.args.get('latest', '').lower() == 'true':
+            start, end = -1, None
+        else:
+            start = int(request.args.get('start', 0))
+            end = int(request.args['end']) if 'end' in request.args else None
+    except ValueError:
+        return jsonify({"error": "start and end must be integers"}), 400
+    paper_data = PAPER_STORE.get_paper(bucket_hash, start=start, end=end)
+    if paper_data is None:
         return jsonify({"error": "Paper not found"}), 404
-    with open(paper_path, 'r') as f:
-        paper_data = json.load(f)
     return jsonify(paper_data), 200
 
 @app.route('/api/list_papers', methods=['GET'])
 def list_papers():
-    return jsonify(os.listdir(PAPERS_DIR))
+    return jsonify([f"{bucket_hash}.json" for bucket_hash in PAPER_STORE.list_buckets()])
 
 @app.route('/api/add_version', methods=['POST'])
 def add_version():
@@ -112,27 +437,235 @@ def add_version():
     content = data.get('content')
     if not all([bucket_hash, content]):
         return jsonify({"error": "Missing required fields"}), 400
-    paper_path = os.path.join(PAPERS_DIR, f"{bucket_hash}.json")
-    if not os.path.exists(paper_path):
+    version_index = PAPER_STORE.add_version(bucket_hash, content, data.get('timestamp', 0))
+    if version_index is None:
         return jsonify({"error": "Paper not found"}), 404
-    with open(paper_path, 'r') as f:
-        paper_data = json.load(f)
-    paper_data['versions'].append({
-        "content": content,
-        "timestamp": data.get('timestamp', 0)
-    })
-    paper_data['content'] = content
-    with open(paper_path, 'w') as f:
-        json.dump(paper_data, f, indent=2)
+    index_version(bucket_hash, content, version_index)
     return jsonify({"success": True, "message": "Version added successfully"})
 
+@app.route('/api/storage_stats', methods=['GET'])
+def storage_stats():
+    return jsonify(PAPER_STORE.stats()), 200
+
+def page_args(default_limit=50):
+    # (offset, limit) from the query string; raises ValueError on bad input
+    offset = int(request.args.get('offset', 0))
+    limit = int(request.args.get('limit', default_limit))
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    return offset, min(limit, REGISTRY_PAGE_LIMIT)
+
+@app.route('/api/registry/papers', methods=['GET'])
+def registry_papers():
+    try:
+        offset, limit = page_args()
+    except ValueError:
+        return jsonify({"error": "offset and limit must be non-negative integers"}), 400
+    papers, total = REGISTRY_INDEX.list_papers(offset, limit, request.args.get('author'))
+    return jsonify({
+        "papers": papers,
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "checkpoint_block": REGISTRY_INDEX.checkpoint()
+    }), 200
+
+@app.route('/api/registry/title', methods=['GET'])
+def registry_title():
+    title = request.args.get('title', '')
+    if not title:
+        return jsonify({"error": "Missing required fields"}), 400
+    paper = REGISTRY_INDEX.find_by_title(title)
+    if paper is None:
+        return jsonify({"exists": False}), 404
+    return jsonify(dict(paper, exists=True)), 200
+
+@app.route('/api/registry/papers/<bucket_hash>', methods=['GET'])
+def registry_paper(bucket_hash):
+    paper = REGISTRY_INDEX.get_paper(bucket_hash)
+    if paper is None:
+        return jsonify({"error": "Paper not found"}), 404
+    return jsonify(paper), 200
+
+@app.route('/api/registry/papers/<bucket_hash>/versions', methods=['GET'])
+def registry_versions(bucket_hash):
+    try:
+        offset, limit = page_args()
+    except ValueError:
+        return jsonify({"error": "offset and limit must be non-negative integers"}), 400
+    paper = REGISTRY_INDEX.get_paper(bucket_hash)
+    if paper is None:
+        return jsonify({"error": "Paper not found"}), 404
+    return jsonify({
+        "bucket_hash": bucket_hash,
+        "version_count": paper["version_count"],
+        "versions": REGISTRY_INDEX.get_versions(bucket_hash, offset, limit),
+        "offset": offset,
+        "limit": limit
+    }), 200
+
+@app.route('/api/registry/reconcile', methods=['GET'])
+def registry_reconcile():
+    try:
+        _, limit = page_args(default_limit=100)
+    except ValueError:
+        return jsonify({"error": "limit must be a positive integer"}), 400
+    return jsonify(REGISTRY_INDEX.reconcile(limit)), 200
+
 # Add this to your imports
 import threading
 from datetime import datetime
 
 
+def consume_check(author_address, title):
+    # Returns the number of checks used before this one, or None at the limit
+    check_key = f"{author_address}:{title}"
+    with timed("check_limit"):
+        current_count = CHECK_LIMITS.consume(check_key, MAX_CHECKS_PER_PAPER)
+    print(f"Current check count for {check_key}: {current_count}")
+    return current_count
+
+def get_author_chain_state(author_address):
+    # Returns (blockchain_available, (checksRemaining, highSimilarityCount, isBanned))
+    if CHAIN_CLIENT is None:
+        return False, None
+    try:
+        with timed("chain_state"):
+            return True, CHAIN_CLIENT.get_author_state(author_address)
+    except ChainUnavailable as e:
+        print(f"Warning: {str(e)}. Proceeding without blockchain verification.")
+        return False, None
+    except Exception as e:
+        print(f"Blockchain connection error: {str(e)}")
+        print("Proceeding without blockchain verification.")
+        return False, None
+
+def log_check(author_address, title, check_number):
+    # Buffered; appended to check_logs/checks.jsonl by the writer thread
+    with timed("check_log"):
+        CHECK_LOG.append({
+            "timestamp": datetime.now().isoformat(),
+            "author": author_address,
+            "title": title,
+            "check_number": check_number
+        })
+
+def candidate_papers(tokens, author_address):
+    """Papers to score exactly for a submission, or None to scan the whole corpus.
+
+    Near-verbatim versions come from the LSH index and edited copies from
+    the papers sharing the most rare tokens. With fewer than top-k
+    candidates the exact scan is used, so a small result is never an
+    artefact of candidate retrieval.
+    """
+    if len(CORPUS_INDEX) < LSH_MIN_CORPUS:
+        return None
+    with timed("lsh_candidates"):
+        candidates = {bucket_hash for bucket_hash, _ in LSH_INDEX.candidates(tokens, limit=LSH_MAX_CANDIDATES)}
+    with timed("token_candidates"):
+        candidates.update(
+            bucket_hash for bucket_hash, _ in CORPUS_INDEX.candidates(
+                tokens,
+                limit=TOKEN_MAX_CANDIDATES,
+                exclude_author=author_address,
+                max_tokens=TOKEN_CANDIDATE_LOOKUPS
+            )
+        )
+    return candidates if len(candidates) >= SIMILAR_PAPERS_TOP_K else None
+
+def find_similar_papers(title, content, author_address, scores=None):
+    """Top-k, same-title and copied-passage matches for one submission.
+
+    `scores` ({bucket_hash: similarity_percent}) may be passed in when the
+    top-k were already computed, e.g. for a whole batch at once.
+    """
+    with timed("preprocess"):
+        processed_content = preprocess_text(content)
+    is_own_paper = lambda bucket_hash: CORPUS_INDEX.author_of(bucket_hash) == author_address
+    if scores is None:
+        # Corpus-wide similarity; large corpora only score the retrieved candidates
+        candidates = candidate_papers(TEXT_PIPELINE.tokens(content), author_address)
+        with timed("top_k"):
+            scores = dict(SIMILARITY_ENGINE.top_k(
+                processed_content,
+                k=SIMILAR_PAPERS_TOP_K,
+                exclude=is_own_paper,
+                candidates=candidates
+            ))
+    else:
+        scores = dict(scores)
+    # A paper with the same title is always reported, however low it scores
+    with timed("title_match"):
+        title_matches = CORPUS_INDEX.find_by_title(title, exclude_author=author_address)
+        for bucket_hash, _ in title_matches:
+            if bucket_hash not in scores:
+                scores[bucket_hash] = SIMILARITY_ENGINE.score(processed_content, bucket_hash)
+    # Copied passages are reported even when the whole-document score is low
+    with timed("passages"):
+        passages = FINGERPRINT_INDEX.matching_passages(content, exclude=is_own_paper)
+        for bucket_hash in passages:
+            if bucket_hash not in scores:
+                scores[bucket_hash] = SIMILARITY_ENGINE.score(processed_content, bucket_hash)
+
+    similar_papers = []
+    with timed("load_papers"):
+        for bucket_hash, paper_similarity in sorted(scores.items(), key=lambda item: item[1], reverse=True):
+            paper_data = load_paper(bucket_hash)
+            if paper_data is None:
+                continue
+            similar_papers.append({
+                "title": paper_data["title"],
+                "author": paper_data.get("author_address", "unknown"),
+                "similarity_percent": paper_similarity,
+                "timestamp": paper_data["versions"][-1].get("timestamp", 0),
+                "bucket_hash": bucket_hash,
+                "matching_passages": passages.get(bucket_hash, []),
+                "copied_percent": copied_chars(passages.get(bucket_hash, [])) / max(len(content), 1) * 100
+            })
+    return similar_papers, bool(title_matches)
+
+def copied_chars(passages):
+    # Characters of the submission covered by the passages, overlaps counted once
+    covered = 0
+    covered_to = 0
+    for start, end in sorted((passage["submission_start"], passage["submission_end"]) for passage in passages):
+        if end > covered_to:
+            covered += end - max(start, covered_to)
+            covered_to = end
+    return covered
+
+def queue_record_check(similar_papers, blockchain_available, author_address):
+    # Hands the check to the background recordCheck queue; returns a receipt id to poll
+    if not similar_papers or not blockchain_available or RECORD_QUEUE is None:
+        return None
+    similarity = max(paper["similarity_percent"] for paper in similar_papers)
+    try:
+        with timed("record_queue"):
+            return RECORD_QUEUE.submit(author_address, similarity)
+    except Exception as e:
+        print(f"Error recording similarity check to blockchain: {str(e)}")
+        return None
+
+def check_result(similar_papers, title_matched, blockchain_available, checks_remaining):
+    similarity = max([paper["similarity_percent"] for paper in similar_papers], default=0.0)
+    # A verbatim copy can score low overall, e.g. before its source is in the TF-IDF vocabulary
+    copied = max([paper.get("copied_percent", 0.0) for paper in similar_papers], default=0.0)
+    plagiarised = similarity >= PLAGIARISM_THRESHOLD or copied >= COPIED_PERCENT_THRESHOLD
+    return {
+        "original_exists": title_matched or plagiarised,
+        "is_original": not plagiarised,
+        "similarity_percent": similarity,
+        "copied_percent": copied,
+        "blockchain_available": blockchain_available,
+        "checks_remaining": checks_remaining,
+        "message": "Potential Plagiarism Detected" if plagiarised else "No Plagiarism Detected",
+        "similar_papers": similar_papers
+    }
+
 @app.route('/api/check_plagiarism', methods=['POST'])
 def check_plagiarism():
+    if not WARMUP["ready"]:
+        return not_ready()
     try:
         print("\n=== Received Plagiarism Check Request ===")
         data = request.json
@@ -149,184 +682,165 @@ def check_plagiarism():
             return jsonify({"error": "Missing required fields"}), 400
             
         # Check if the author has reached their limit for this paper
-        check_key = f"{author_address}:{title}"
-        with check_limits_lock:
-            current_count = CHECK_LIMITS.get(check_key, 0)
-            print(f"Current check count for {check_key}: {current_count}")
-            
-            if current_count >= 3:
+        current_count = consume_check(author_address, title)
+        if current_count is None:
+            return jsonify({
+                "error": "Maximum plagiarism check limit reached for this paper",
+                "allowed": False,
+                "checks_remaining": 0
+            }), 403
+        checks_remaining = MAX_CHECKS_PER_PAPER - (current_count + 1)
+
+        # Try to connect to the blockchain, but gracefully handle connection issues
+        allowed = {"checksRemaining": checks_remaining, "banned": False}  # Default values if blockchain is unavailable
+        blockchain_available, author_state = get_author_chain_state(author_address)
+        if author_state is not None:
+            allowed = {
+                "checksRemaining": min(checks_remaining, author_state[0]),  # Take the lower value
+                "banned": author_state[2]
+            }
+
+            if not allowed["checksRemaining"] > 0 or allowed["banned"]:
                 return jsonify({
-                    "error": "Maximum plagiarism check limit reached for this paper",
+                    "error": "Plagiarism check limit exceeded",
                     "allowed": False,
                     "checks_remaining": 0
                 }), 403
-            
-            # Increment the counter
-            CHECK_LIMITS[check_key] = current_count + 1
-            checks_remaining = 3 - CHECK_LIMITS[check_key]
 
-        # Try to connect to the blockchain, but gracefully handle connection issues
-        blockchain_available = True
-        allowed = {"checksRemaining": checks_remaining, "banned": False}  # Default values if blockchain is unavailable
-        
-        try:
-            # Web3 Contract Check
-            w3 = Web3(Web3.HTTPProvider('http://localhost:8545', request_kwargs={'timeout': 5}))
-            if not w3.is_connected():
-                print("Warning: Could not connect to Ethereum node. Proceeding without blockchain verification.")
-                blockchain_available = False
-            else:
-                checker_contract_address = "0x477d1a04263C98ECC5b4482D2FE24fA6f5D59a5D"
-                checksum_address = w3.to_checksum_address(author_address)
-                
-                checker_abi = [
-                    {
-                        "anonymous": False,
-                        "inputs": [
-                            {"indexed": True, "internalType": "address", "name": "author", "type": "address"},
-                            {"indexed": False, "internalType": "uint256", "name": "similarity", "type": "uint256"},
-                            {"indexed": False, "internalType": "uint256", "name": "checksRemaining", "type": "uint256"},
-                            {"indexed": False, "internalType": "bool", "name": "isBanned", "type": "bool"}
-                        ],
-                        "name": "PlagiarismChecked",
-                        "type": "event"
-                    },
-                    {
-                        "inputs": [{"internalType": "address", "name": "", "type": "address"}],
-                        "name": "authorStates",
-                        "outputs": [
-                            {"internalType": "uint256", "name": "checksRemaining", "type": "uint256"},
-                            {"internalType": "uint256", "name": "highSimilarityCount", "type": "uint256"},
-                            {"internalType": "bool", "name": "isBanned", "type": "bool"}
-                        ],
-                        "stateMutability": "view",
-                        "type": "function"
-                    },
-                    {
-                        "inputs": [
-                            {"internalType": "address", "name": "author", "type": "address"},
-                            {"internalType": "uint256", "name": "similarity", "type": "uint256"}
-                        ],
-                        "name": "recordCheck",
-                        "outputs": [{"internalType": "bool", "name": "allowed", "type": "bool"}],
-                        "stateMutability": "nonpayable",
-                        "type": "function"
-                    },
-                    {
-                        "inputs": [{"internalType": "address", "name": "author", "type": "address"}],
-                        "name": "getAuthorState",
-                        "outputs": [
-                            {"internalType": "uint256", "name": "checksRemaining", "type": "uint256"},
-                            {"internalType": "uint256", "name": "highSimilarityCount", "type": "uint256"},
-                            {"internalType": "bool", "name": "isBanned", "type": "bool"}
-                        ],
-                        "stateMutability": "view",
-                        "type": "function"
-                    }
-                ]
+        similar_papers, title_matched = find_similar_papers(title, content, author_address)
+
+        # Create a log entry for this check
+        log_check(author_address, title, current_count + 1)
+
+        result = check_result(similar_papers, title_matched, blockchain_available, allowed["checksRemaining"])
+        result["record_receipt_id"] = queue_record_check(similar_papers, blockchain_available, author_address)
+        return jsonify(result)
 
-                checker = w3.eth.contract(address=checker_contract_address, abi=checker_abi)
-                author_state = checker.functions.getAuthorState(checksum_address).call()
-                allowed = {
-                    "checksRemaining": min(checks_remaining, author_state[0]),  # Take the lower value
-                    "banned": author_state[2]
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({
+            "error": "Internal server error",
+            "details": str(e)
+        }), 500
+
+@app.route('/api/check_plagiarism_batch', methods=['POST'])
+def check_plagiarism_batch():
+    """Check many submissions at once, e.g. a whole class at a deadline.
+
+    Submissions are tokenized on a process pool, scored against the corpus
+    with one sparse matrix product and compared with each other, so
+    students copying from one another show up in peer_matches. Per-author
+    check limits apply to every item individually.
+    """
+    if not WARMUP["ready"]:
+        return not_ready()
+    try:
+        data = request.json
+        submissions = (data or {}).get('submissions')
+        if not isinstance(submissions, list) or not submissions:
+            return jsonify({"error": "No submissions received"}), 400
+        if len(submissions) > MAX_BATCH_SIZE:
+            return jsonify({"error": f"At most {MAX_BATCH_SIZE} submissions per batch"}), 400
+        print(f"\n=== Received Batch Plagiarism Check Request ({len(submissions)} submissions) ===")
+
+        results = [None] * len(submissions)
+        accepted = []
+        for index, item in enumerate(submissions):
+            item = item if isinstance(item, dict) else {}
+            title = str(item.get('title', '')).strip().lower()
+            content = str(item.get('content', '')).strip()
+            author_address = str(item.get('authorAddress', '')).strip().lower()
+            if not all([title, content, author_address]):
+                results[index] = {"error": "Missing required fields"}
+                continue
+            current_count = consume_check(author_address, title)
+            if current_count is None:
+                results[index] = {
+                    "error": "Maximum plagiarism check limit reached for this paper",
+                    "allowed": False,
+                    "checks_remaining": 0
                 }
-                
-                if not allowed["checksRemaining"] > 0 or allowed["banned"]:
-                    return jsonify({
+                continue
+            accepted.append({
+                "index": index,
+                "id": item.get('id'),
+                "title": title,
+                "content": content,
+                "author_address": author_address,
+                "check_number": current_count + 1,
+                "checks_remaining": MAX_CHECKS_PER_PAPER - (current_count + 1)
+            })
+
+        # One chain lookup per author rather than per submission
+        chain_states = {
+            author_address: get_author_chain_state(author_address)
+            for author_address in {item["author_address"] for item in accepted}
+        }
+        checked = []
+        for item in accepted:
+            blockchain_available, author_state = chain_states[item["author_address"]]
+            item["blockchain_available"] = blockchain_available
+            if author_state is not None:
+                item["checks_remaining"] = min(item["checks_remaining"], author_state[0])
+                if not item["checks_remaining"] > 0 or author_state[2]:
+                    results[item["index"]] = {
                         "error": "Plagiarism check limit exceeded",
                         "allowed": False,
                         "checks_remaining": 0
-                    }), 403
-        except Exception as e:
-            print(f"Blockchain connection error: {str(e)}")
-            print("Proceeding without blockchain verification.")
-            blockchain_available = False
-
-        # Local paper similarity check
-        original_paper = None
-        matching_filename = None
-        for filename in os.listdir(PAPERS_DIR):
-            if not filename.endswith(".json"):
-                continue
-            paper_path = os.path.join(PAPERS_DIR, filename)
-            try:
-                with open(paper_path, 'r') as f:
-                    paper_data = json.load(f)
-                paper_title = paper_data.get("title", "").lower().strip()
-                stored_author = paper_data.get("author_address", "").split(" ")[0].lower().strip()
-                if paper_title == title and stored_author != author_address:
-                    original_paper = paper_data
-                    matching_filename = filename
-                    break
-            except Exception as e:
-                continue
+                    }
+                    continue
+            checked.append(item)
 
-        # Create a log entry for this check
-        check_log_entry = {
-            "timestamp": datetime.now().isoformat(),
-            "author": author_address,
-            "title": title,
-            "check_number": current_count + 1
-        }
-        
-        # You could save this to a file if you need persistence
-        check_log_dir = os.path.join(os.path.dirname(__file__), 'check_logs')
-        os.makedirs(check_log_dir, exist_ok=True)
-        log_file = os.path.join(check_log_dir, f"{author_address.replace('0x', '')}.json")
-        
-        try:
-            if os.path.exists(log_file):
-                with open(log_file, 'r') as f:
-                    log_data = json.load(f)
-            else:
-                log_data = {"checks": []}
-                
-            log_data["checks"].append(check_log_entry)
-            
-            with open(log_file, 'w') as f:
-                json.dump(log_data, f, indent=2)
-        except Exception as e:
-            print(f"Warning: Failed to log check: {str(e)}")
+        contents = [item["content"] for item in checked]
+        executor = get_preprocess_pool() if len(contents) >= BATCH_POOL_MIN_SIZE else None
+        # Batch-wide stages get their own names; find_similar_papers times each item below
+        with timed("batch_preprocess"):
+            tokenized = TEXT_PIPELINE.tokens_many(contents, executor=executor)
+            processed = [' '.join(tokens) for tokens in tokenized]
+        # Same candidate retrieval as a single check; None entries scan the corpus
+        candidates = [candidate_papers(tokens, item["author_address"]) for tokens, item in zip(tokenized, checked)]
+        with timed("batch_top_k"):
+            corpus_matches = SIMILARITY_ENGINE.top_k_many(
+                processed,
+                k=SIMILAR_PAPERS_TOP_K,
+                excludes=[
+                    (lambda bucket_hash, author_address=item["author_address"]:
+                        CORPUS_INDEX.author_of(bucket_hash) == author_address)
+                    for item in checked
+                ],
+                candidates=candidates
+            )
+        with timed("peer_similarity"):
+            peer_scores = pairwise_similarity(processed)
 
-        if original_paper:
-            original_content = original_paper["versions"][-1]["content"]
-            similarity = float(calculate_similarity(content, original_content))
-            
-            # Try to record the check to the blockchain if it's available
-            if blockchain_available:
-                try:
-                    # This would be where you call the recordCheck function on the smart contract
-                    # We're skipping the actual transaction for now
-                    pass
-                except Exception as e:
-                    print(f"Error recording similarity check to blockchain: {str(e)}")
-            
-            return jsonify({
-                "original_exists": True,
-                "is_original": bool(similarity < 30),
-                "similarity_percent": similarity,
-                "blockchain_available": blockchain_available,
-                "checks_remaining": allowed["checksRemaining"],
-                "message": "Potential Plagiarism Detected" if similarity >= 30 else "No Plagiarism Detected",
-                "similar_papers": [{
-                    "title": original_paper["title"],
-                    "author": original_paper.get("author_address", "unknown"),
-                    "similarity_percent": similarity,
-                    "timestamp": original_paper["versions"][-1].get("timestamp", 0),
-                    "bucket_hash": os.path.splitext(matching_filename)[0]
-                }]
-            })
-        else:
-            return jsonify({
-                "original_exists": False,
-                "is_original": True,
-                "similarity_percent": 0,
-                "blockchain_available": blockchain_available,
-                "checks_remaining": allowed["checksRemaining"],
-                "message": "No Plagiarism Detected",
-                "similar_papers": []
-            })
+        for position, item in enumerate(checked):
+            similar_papers, title_matched = find_similar_papers(
+                item["title"], item["content"], item["author_address"], scores=corpus_matches[position]
+            )
+            result = check_result(
+                similar_papers, title_matched, item["blockchain_available"], item["checks_remaining"]
+            )
+            result["peer_matches"] = [
+                {
+                    "index": other["index"],
+                    "id": other["id"],
+                    "similarity_percent": float(peer_scores[position][other_position])
+                }
+                for other_position, other in enumerate(checked)
+                if other_position != position
+                and other["author_address"] != item["author_address"]
+                and peer_scores[position][other_position] >= PLAGIARISM_THRESHOLD
+            ]
+            if result["peer_matches"]:
+                result["is_original"] = False
+                result["message"] = "Potential Plagiarism Detected"
+            result["record_receipt_id"] = queue_record_check(
+                similar_papers, item["blockchain_available"], item["author_address"]
+            )
+            log_check(item["author_address"], item["title"], item["check_number"])
+            results[item["index"]] = result
+
+        return jsonify({"results": results})
 
     except Exception as e:
         traceback.print_exc()
@@ -335,6 +849,13 @@ def check_plagiarism():
             "details": str(e)
         }), 500
 
+@app.route('/api/record_status/<receipt_id>', methods=['GET'])
+def record_status(receipt_id):
+    receipt = RECORD_QUEUE.status(receipt_id) if RECORD_QUEUE is not None else None
+    if receipt is None:
+        return jsonify({"error": "Unknown receipt id"}), 404
+    return jsonify(receipt), 200
+
 @app.route('/api/check_limit', methods=['POST'])
 def check_limit():
     data = request.json
@@ -345,14 +866,13 @@ def check_limit():
         return jsonify({"error": "Missing required fields"}), 400
         
     check_key = f"{author_address}:{title}"
-    with check_limits_lock:
-        current_count = CHECK_LIMITS.get(check_key, 0)
-        remaining = max(0, 3 - current_count)
+    current_count = CHECK_LIMITS.get(check_key)
+    remaining = max(0, MAX_CHECKS_PER_PAPER - current_count)
     
     return jsonify({
         "checks_used": current_count,
         "checks_remaining": remaining,
-        "max_limit_reached": current_count >= 3
+        "max_limit_reached": current_count >= MAX_CHECKS_PER_PAPER
     }), 200 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=True)
@@ -0,0 +1,303 @@
+# python_service/benchmarks/bench_service.py
+"""Load benchmark for the plagiarism service.
+
+Generates a synthetic corpus of legacy papers/<bucket_hash>.json files
+(Zipf-distributed vocabulary, log-normal paper lengths), starts the app on
+it in a scratch directory and drives store_paper, add_version,
+check_plagiarism and list_papers through the Flask test client from
+`--concurrency` threads. Reports start-up time, throughput and p50/p95/p99
+latency per operation, plus the mean time of each check stage from the
+/metrics histograms.
+
+    python benchmarks/bench_service.py --papers 1000,10000,100000 --concurrency 8
+
+Each corpus size runs in its own process so the app starts cold. Corpora
+are cached under --workdir and reused when the size and seed match.
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LETTERS = np.array(list("abcdefghijklmnopqrstuvwxyz"))
+
+
+class CorpusGenerator:
+    """Deterministic synthetic papers; digits are avoided since preprocessing strips them."""
+
+    def __init__(self, seed=1, vocabulary_size=20000, authors=500, median_words=1500):
+        self.rng = np.random.default_rng(seed)
+        lengths = self.rng.integers(3, 11, size=vocabulary_size)
+        self.vocabulary = np.array([
+            ''.join(self.rng.choice(LETTERS, size=length)) for length in lengths
+        ])
+        ranks = np.arange(1, vocabulary_size + 1)
+        self.weights = (1.0 / ranks) / (1.0 / ranks).sum()
+        self.authors = [
+            "0x" + hashlib.sha1(f"author-{seed}-{index}".encode()).hexdigest() for index in range(authors)
+        ]
+        self.median_words = median_words
+
+    def text(self, words=None):
+        if words is None:
+            words = int(np.clip(self.rng.lognormal(np.log(self.median_words), 0.6), 200, 8000))
+        tokens = self.rng.choice(self.vocabulary, size=words, p=self.weights)
+        sentences = []
+        position = 0
+        while position < words:
+            length = int(self.rng.integers(8, 26))
+            sentence = ' '.join(tokens[position:position + length])
+            sentences.append(sentence[:1].upper() + sentence[1:] + '.')
+            position += length
+        # Paragraph breaks every ~6 sentences so line diffs have something to work with
+        return '\n'.join(' '.join(sentences[i:i + 6]) for i in range(0, len(sentences), 6))
+
+    def edit(self, content, fraction=0.1):
+        # Replace a random share of the lines, as a new version or a light paraphrase would
+        lines = content.split('\n')
+        for line in self.rng.choice(len(lines), size=max(1, int(len(lines) * fraction)), replace=True):
+            lines[line] = self.text(words=max(20, len(lines[line].split())))
+        return '\n'.join(lines)
+
+    def paper(self, index):
+        bucket_hash = "0x" + hashlib.sha256(f"paper-{index}".encode()).hexdigest()
+        title = f"Synthetic study {' '.join(self.rng.choice(self.vocabulary[:2000], size=5))} {index}"
+        author = self.authors[int(self.rng.integers(len(self.authors)))]
+        content = self.text()
+        versions = [{"content": content, "timestamp": 1700000000 + index}]
+        # A fifth of the papers already have a revision
+        if self.rng.random() < 0.2:
+            content = self.edit(content)
+            versions.append({"content": content, "timestamp": 1700000000 + index + 86400})
+        return {
+            "bucket_hash": bucket_hash,
+            "title": title,
+            "content": content,
+            "author_address": author,
+            "versions": versions
+        }
+
+
+def generate_corpus(papers_dir, count, seed):
+    marker = os.path.join(papers_dir, ".corpus.json")
+    if os.path.exists(marker):
+        with open(marker, 'r') as f:
+            if json.load(f) == {"count": count, "seed": seed}:
+                return False
+    shutil.rmtree(papers_dir, ignore_errors=True)
+    os.makedirs(papers_dir)
+    generator = CorpusGenerator(seed=seed)
+    for index in range(count):
+        paper = generator.paper(index)
+        with open(os.path.join(papers_dir, f"{paper['bucket_hash']}.json"), 'w') as f:
+            json.dump(paper, f)
+    with open(marker, 'w') as f:
+        json.dump({"count": count, "seed": seed}, f)
+    return True
+
+
+def percentiles(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None}
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {"p50_ms": round(float(p50), 2), "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+
+
+def drive(app_module, name, requests, concurrency):
+    """Run (method, path, json) requests from `concurrency` threads; returns a result row."""
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def send(spec):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app_module.app.test_client()
+        method, path, body = spec
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(send, requests))
+    wall = time.perf_counter() - started
+    row = {
+        "operation": name,
+        "requests": len(requests),
+        "errors": len(errors),
+        "throughput_rps": round(len(requests) / wall, 1) if wall else None
+    }
+    row.update(percentiles(latencies))
+    return row
+
+
+def run_one(args):
+    workdir = os.path.join(args.workdir, f"corpus-{args.papers}-{args.seed}")
+    papers_dir = os.path.join(workdir, "papers")
+    generated_at = time.perf_counter()
+    if generate_corpus(papers_dir, args.papers, args.seed):
+        print(f"Generated {args.papers} papers in {time.perf_counter() - generated_at:.1f}s", file=sys.stderr)
+
+    state_dir = os.path.join(workdir, "state")
+    if not args.keep_state:
+        shutil.rmtree(state_dir, ignore_errors=True)
+    os.environ.update({
+        "PAPERS_DIR": papers_dir,
+        "PAPER_DB_PATH": os.path.join(state_dir, "papers.db"),
+        "INDEX_DIR": os.path.join(state_dir, "indexes"),
+        "REGISTRY_DB_PATH": os.path.join(state_dir, "registry.db"),
+        "CHECK_LIMITS_DIR": os.path.join(state_dir, "check_limits"),
+        "CHECK_LOG_DIR": os.path.join(state_dir, "check_logs"),
+        "WARMUP_IN_BACKGROUND": "false",
+        "OFFLINE_MODE": "true"
+    })
+    if not args.chain:
+        # No artifact means no chain client, so Web3 latency does not skew the numbers
+        os.environ["CHECKER_ARTIFACT_PATH"] = os.path.join(state_dir, "no-chain.json")
+
+    sys.path.insert(0, SERVICE_DIR)
+    started = time.perf_counter()
+    import app as app_module
+    startup = time.perf_counter() - started
+
+    generator = CorpusGenerator(seed=args.seed + 1)
+    existing = app_module.PAPER_STORE.list_buckets()
+    rng = np.random.default_rng(args.seed + 2)
+    count = args.requests
+
+    new_papers = [generator.paper(args.papers + index) for index in range(count)]
+    store_requests = [
+        ("POST", "/api/store_paper", {
+            "bucketHash": paper["bucket_hash"],
+            "title": paper["title"],
+            "content": paper["content"],
+            "authorAddress": paper["author_address"],
+            "timestamp": paper["versions"][-1]["timestamp"]
+        })
+        for paper in new_papers
+    ]
+
+    version_requests = []
+    for bucket_hash in rng.choice(existing, size=count):
+        latest = app_module.load_paper(str(bucket_hash))
+        version_requests.append(("POST", "/api/add_version", {
+            "bucketHash": str(bucket_hash),
+            "content": generator.edit(latest["content"]),
+            "timestamp": int(time.time())
+        }))
+
+    check_requests = []
+    for index in range(count):
+        if rng.random() < args.copy_ratio:
+            # Lightly edited copy of a stored paper
+            source = app_module.load_paper(str(rng.choice(existing)))
+            content = generator.edit(source["content"], fraction=0.3)
+        else:
+            content = generator.text()
+        check_requests.append(("POST", "/api/check_plagiarism", {
+            "title": f"benchmark submission {index}",
+            "content": content,
+            "authorAddress": "0x" + hashlib.sha1(f"bench-{index}".encode()).hexdigest()
+        }))
+
+    list_requests = [("GET", "/api/list_papers", None)] * max(1, count // 10)
+
+    results = [
+        drive(app_module, "store_paper", store_requests, args.concurrency),
+        drive(app_module, "add_version", version_requests, args.concurrency),
+        drive(app_module, "check_plagiarism", check_requests, args.concurrency),
+        drive(app_module, "list_papers", list_requests, args.concurrency)
+    ]
+    stages = {
+        f"{endpoint}.{stage}": round(total / calls * 1000, 3)
+        for (endpoint, stage), (calls, total) in sorted(app_module.METRICS.stages.totals().items())
+        if calls
+    }
+    return {
+        "papers": args.papers,
+        "concurrency": args.concurrency,
+        "startup_seconds": round(startup, 2),
+        "warmup_source": app_module.WARMUP["source"],
+        "operations": results,
+        "stage_mean_ms": stages
+    }
+
+
+def print_report(report):
+    print(f"\n== {report['papers']} papers, concurrency {report['concurrency']} ==")
+    print(f"start-up {report['startup_seconds']}s (indexes from {report['warmup_source']})")
+    header = f"{'operation':<18}{'requests':>9}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}"
+    print(header)
+    print('-' * len(header))
+    for row in report["operations"]:
+        print(
+            f"{row['operation']:<18}{row['requests']:>9}{row['errors']:>8}{row['throughput_rps']:>10}"
+            f"{row['p50_ms']:>10}{row['p95_ms']:>10}{row['p99_ms']:>10}"
+        )
+    if report["stage_mean_ms"]:
+        print("mean stage time (ms):")
+        for stage, mean in report["stage_mean_ms"].items():
+            print(f"  {stage:<40}{mean:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument("--papers", default="1000", help="comma-separated corpus sizes, e.g. 1000,10000,100000")
+    parser.add_argument("--requests", type=int, default=200, help="requests per operation")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--copy-ratio", type=float, default=0.5, help="share of checks that copy a stored paper")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "plagiarism-bench"))
+    parser.add_argument("--keep-state", action="store_true", help="reuse the database and warm snapshot")
+    parser.add_argument("--chain", action="store_true", help="talk to the configured Ethereum node")
+    parser.add_argument("--json", dest="json_path", help="also write the results to this file")
+    parser.add_argument("--report-to", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.report_to:
+        # Child process for one corpus size
+        args.papers = int(args.papers)
+        report = run_one(args)
+        with open(args.report_to, 'w') as f:
+            json.dump(report, f)
+        return
+
+    reports = []
+    for size in [int(size) for size in args.papers.split(',')]:
+        report_path = os.path.join(args.workdir, f"report-{size}.json")
+        command = [sys.executable, os.path.abspath(__file__), "--report-to", report_path, "--papers", str(size)]
+        for flag, value in (("--requests", args.requests), ("--concurrency", args.concurrency),
+                            ("--copy-ratio", args.copy_ratio), ("--seed", args.seed), ("--workdir", args.workdir)):
+            command += [flag, str(value)]
+        command += [flag for flag, enabled in (("--keep-state", args.keep_state), ("--chain", args.chain)) if enabled]
+        # The app prints per-request telemetry; keep it out of the report
+        os.makedirs(args.workdir, exist_ok=True)
+        subprocess.run(command, stdout=subprocess.DEVNULL, check=True)
+        with open(report_path, 'r') as f:
+            report = json.load(f)
+        print_report(report)
+        reports.append(report)
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# python_service/chain_client.py
+import json
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class ChainUnavailable(Exception):
+    pass
+
+
+class CircuitBreaker:
+    """Stops calling the node after repeated failures.
+
+    After `failure_threshold` consecutive failures the breaker opens and
+    calls fail fast for `reset_timeout` seconds; then a single trial call
+    is let through (half-open) and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, failure_threshold=3, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half-open"
+            return "open"
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._opened_at is not None or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def is_transport_failure(error):
+    # Only an unreachable or failing node should trip a breaker; reverts, RPC
+    # errors and receipt timeouts are answers from a healthy node
+    if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is None or error.response.status_code >= 500
+    return False
+
+
+def load_contract_artifact(artifact_path, address=None):
+    # Truffle build artifact: ABI plus the address of the last deployment
+    with open(artifact_path, 'r') as f:
+        artifact = json.load(f)
+    if address is None:
+        networks = artifact.get("networks") or {}
+        if networks:
+            address = list(networks.values())[-1]["address"]
+    return artifact["abi"], address
+
+
+class ChainClient:
+    """Long-lived connection to the PlagiarismChecker contract.
+
+    One pooled HTTP session and one contract handle are shared by every
+    request. Node calls go through a circuit breaker so an outage costs one
+    timeout rather than one per request, and getAuthorState results are
+    cached for `state_ttl` seconds. A background listener drops an author's
+    cached state as soon as a PlagiarismChecked event for them is mined.
+    """
+
+    def __init__(self, rpc_url, artifact_path, contract_address=None, timeout=5,
+                 pool_size=10, state_ttl=10.0, breaker=None):
+        self.rpc_url = rpc_url
+        self.state_ttl = state_ttl
+        self.breaker = breaker or CircuitBreaker()
+        self.abi, address = load_contract_artifact(artifact_path, contract_address)
+        # web3 takes seconds to import, so only pay for it once a client is built
+        from web3 import Web3
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        self.w3 = Web3(Web3.HTTPProvider(rpc_url, request_kwargs={'timeout': timeout}, session=session))
+        self.contract = self.w3.eth.contract(address=Web3.to_checksum_address(address), abi=self.abi)
+
+        self._state_cache = {}
+        self._cache_lock = threading.Lock()
+        self._listener = None
+
+    def call(self, fn, *args, **kwargs):
+        return self.call_with(self.breaker, fn, *args, **kwargs)
+
+    def call_with(self, breaker, fn, *args, **kwargs):
+        # Background workers pass their own breaker so they cannot switch off checks
+        if not breaker.allow():
+            raise ChainUnavailable(f"Ethereum node at {self.rpc_url} is unavailable (circuit open)")
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_transport_failure(e):
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            raise
+        breaker.record_success()
+        return result
+
+    def get_author_state(self, author_address):
+        # (checksRemaining, highSimilarityCount, isBanned)
+        key = author_address.lower()
+        now = time.monotonic()
+        with self._cache_lock:
+            cached = self._state_cache.get(key)
+            if cached is not None and cached[0] > now:
+                return cached[1]
+        checksum_address = self.w3.to_checksum_address(author_address)
+        state = tuple(self.call(self.contract.functions.getAuthorState(checksum_address).call))
+        with self._cache_lock:
+            self._state_cache[key] = (now + self.state_ttl, state)
+        return state
+
+    def invalidate_author(self, author_address=None):
+        with self._cache_lock:
+            if author_address is None:
+                self._state_cache.clear()
+            else:
+                self._state_cache.pop(author_address.lower(), None)
+
+    def start_event_listener(self, poll_interval=2.0):
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self._listen, args=(poll_interval,), name="chain-events", daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self, poll_interval):
+        event = self.contract.events.PlagiarismChecked()
+        topic = self.w3.to_hex(self.w3.keccak(text="PlagiarismChecked(address,uint256,uint256,bool)"))
+        last_block = None
+        while True:
+            time.sleep(poll_interval)
+            if not self.breaker.allow():
+                continue
+            try:
+                latest = self.w3.eth.block_number
+                if last_block is None:
+                    # We may have missed events while disconnected
+                    self.invalidate_author()
+                    last_block = latest
+                elif latest > last_block:
+                    logs = self.w3.eth.get_logs({
+                        "address": self.contract.address,
+                        "fromBlock": last_block + 1,
+                        "toBlock": latest,
+                        "topics": [topic]
+                    })
+                    for log in logs:
+                        self.invalidate_author(event.process_log(log)["args"]["author"])
+                    last_block = latest
+                self.breaker.record_success()
+            except Exception as e:
+                if is_transport_failure(e):
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.record_success()
+                last_block = None
+                print(f"Warning: PlagiarismChecked listener error: {str(e)}")
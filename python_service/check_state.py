@@ -0,0 +1,123 @@
+# python_service/check_state.py
+import json
+import os
+import threading
+import zlib
+
+from sqlite_util import ThreadConnections, immediate_transaction
+
+
+class CheckLogWriter:
+    """Buffered append-only JSON-lines log of plagiarism checks.
+
+    Entries are queued in memory and a background thread appends them to
+    `<log_dir>/checks.jsonl` every `flush_interval` seconds (or as soon as
+    `max_buffer` entries are waiting). Each flush is one O_APPEND write
+    (continued if the kernel takes only part of it), so several worker
+    processes can share the file.
+    """
+
+    def __init__(self, log_dir, flush_interval=1.0, max_buffer=1000, filename="checks.jsonl"):
+        self.path = os.path.join(log_dir, filename)
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        os.makedirs(log_dir, exist_ok=True)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="check-log-writer", daemon=True)
+            self._thread.start()
+
+    def append(self, entry):
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            self._wakeup.set()
+
+    def flush(self):
+        with self._write_lock:
+            with self._lock:
+                entries, self._buffer = self._buffer, []
+            if not entries:
+                return
+            data = ''.join(json.dumps(entry, separators=(',', ':')) + '\n' for entry in entries)
+            pending = memoryview(data.encode('utf-8'))
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                while pending:
+                    pending = pending[os.write(fd, pending):]
+            finally:
+                os.close(fd)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"Warning: Failed to write check log: {str(e)}")
+
+
+class CheckLimitStore:
+    """Per-(author, title) check counters shared by every worker process.
+
+    Counters live in `shards` SQLite (WAL) files under `limits_dir`, picked
+    by a hash of the key, so concurrent increments for different keys rarely
+    wait on the same write lock. consume() reads and increments inside one
+    BEGIN IMMEDIATE transaction, which makes it atomic across processes.
+    The shard count is recorded in every shard and must not change for an
+    existing directory.
+    """
+
+    def __init__(self, limits_dir, shards=8):
+        self.limits_dir = limits_dir
+        self.shards = shards
+        self._connections = ThreadConnections()
+        os.makedirs(limits_dir, exist_ok=True)
+        for shard in range(shards):
+            conn = self._connection(shard)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS check_limits (check_key TEXT PRIMARY KEY, count INTEGER NOT NULL) "
+                "WITHOUT ROWID"
+            )
+            recorded = conn.execute("PRAGMA user_version").fetchone()[0]
+            if recorded == 0:
+                conn.execute(f"PRAGMA user_version = {shards}")
+            elif recorded != shards:
+                raise ValueError(f"{limits_dir} was created with {recorded} shards, not {shards}")
+
+    def _connection(self, shard):
+        return self._connections.get(os.path.join(self.limits_dir, f"limits-{shard}.db"))
+
+    def _shard(self, check_key):
+        return zlib.crc32(check_key.encode('utf-8')) % self.shards
+
+    def _transaction(self, check_key):
+        return immediate_transaction(self._connection(self._shard(check_key)))
+
+    def get(self, check_key):
+        row = self._connection(self._shard(check_key)).execute(
+            "SELECT count FROM check_limits WHERE check_key = ?", (check_key,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def consume(self, check_key, limit):
+        # Returns the count before this check, or None if the limit is reached
+        with self._transaction(check_key) as conn:
+            row = conn.execute("SELECT count FROM check_limits WHERE check_key = ?", (check_key,)).fetchone()
+            current_count = row[0] if row else 0
+            if current_count >= limit:
+                return None
+            conn.execute(
+                "INSERT INTO check_limits (check_key, count) VALUES (?, 1) "
+                "ON CONFLICT (check_key) DO UPDATE SET count = count + 1",
+                (check_key,)
+            )
+        return current_count
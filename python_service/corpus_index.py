@@ -0,0 +1,139 @@
+# python_service/corpus_index.py
+import pickle
+import threading
+from collections import Counter, defaultdict
+
+
+def normalize_title(title):
+    return (title or '').strip().lower()
+
+
+def normalize_author(author_address):
+    # Stored authors may carry a " (shared)" suffix; only the address matters
+    return (author_address or '').split(' ')[0].strip().lower()
+
+
+class CorpusIndex:
+    """In-memory view of the papers corpus.
+
+    Keeps normalized title -> {bucket_hash: author} and an inverted token
+    index over the latest version of each paper, so a check only has to
+    open the papers it actually matches instead of scanning PAPERS_DIR.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._titles = defaultdict(dict)
+        self._papers = {}
+        self._postings = defaultdict(set)
+
+    def __len__(self):
+        return len(self._papers)
+
+    def upsert(self, bucket_hash, title, author_address, tokens):
+        tokens = set(tokens)
+        with self._lock:
+            previous = self._papers.get(bucket_hash)
+            if previous is not None:
+                self._titles[previous["title"]].pop(bucket_hash, None)
+                if not self._titles[previous["title"]]:
+                    del self._titles[previous["title"]]
+                self._drop_postings(bucket_hash, previous["tokens"])
+            entry = {
+                "title": normalize_title(title),
+                "author": normalize_author(author_address),
+                "tokens": tokens,
+            }
+            self._papers[bucket_hash] = entry
+            self._titles[entry["title"]][bucket_hash] = entry["author"]
+            for token in tokens:
+                self._postings[token].add(bucket_hash)
+
+    def update_content(self, bucket_hash, tokens):
+        tokens = set(tokens)
+        with self._lock:
+            entry = self._papers.get(bucket_hash)
+            if entry is None:
+                return False
+            self._drop_postings(bucket_hash, entry["tokens"])
+            entry["tokens"] = tokens
+            for token in tokens:
+                self._postings[token].add(bucket_hash)
+            return True
+
+    def set_author(self, bucket_hash, author_address):
+        with self._lock:
+            entry = self._papers.get(bucket_hash)
+            if entry is None:
+                return
+            entry["author"] = normalize_author(author_address)
+            self._titles[entry["title"]][bucket_hash] = entry["author"]
+
+    def find_by_title(self, title, exclude_author=None):
+        exclude_author = normalize_author(exclude_author) if exclude_author else None
+        with self._lock:
+            matches = self._titles.get(normalize_title(title), {})
+            return [
+                (bucket_hash, author) for bucket_hash, author in matches.items()
+                if author != exclude_author
+            ]
+
+    def author_of(self, bucket_hash):
+        with self._lock:
+            entry = self._papers.get(bucket_hash)
+            return entry["author"] if entry else None
+
+    def candidates(self, tokens, limit=None, exclude_author=None, max_tokens=None):
+        """Papers ranked by how many distinct query tokens they share.
+
+        With `max_tokens`, only that many of the rarest query tokens are
+        looked up, so words that occur in most papers do not touch every
+        posting list. An edited copy still shares nearly all of its source's
+        rare words, however much its word order changed.
+        """
+        exclude_author = normalize_author(exclude_author) if exclude_author else None
+        counts = Counter()
+        with self._lock:
+            postings = [self._postings[token] for token in set(tokens) if token in self._postings]
+            if max_tokens:
+                postings = sorted(postings, key=len)[:max_tokens]
+            for posting in postings:
+                counts.update(posting)
+            if exclude_author:
+                counts = {
+                    bucket_hash: count for bucket_hash, count in counts.items()
+                    if self._papers[bucket_hash]["author"] != exclude_author
+                }
+        ranked = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def save(self, path):
+        with self._lock:
+            papers = {bucket_hash: dict(entry) for bucket_hash, entry in self._papers.items()}
+        with open(path, 'wb') as f:
+            pickle.dump(papers, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        # Titles and postings are cheap to rebuild from the per-paper entries
+        with open(path, 'rb') as f:
+            papers = pickle.load(f)
+        titles = defaultdict(dict)
+        postings = defaultdict(set)
+        for bucket_hash, entry in papers.items():
+            titles[entry["title"]][bucket_hash] = entry["author"]
+            for token in entry["tokens"]:
+                postings[token].add(bucket_hash)
+        with self._lock:
+            self._papers = papers
+            self._titles = titles
+            self._postings = postings
+        return len(papers)
+
+    def _drop_postings(self, bucket_hash, tokens):
+        for token in tokens:
+            posting = self._postings.get(token)
+            if posting is None:
+                continue
+            posting.discard(bucket_hash)
+            if not posting:
+                del self._postings[token]
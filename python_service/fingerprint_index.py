@@ -0,0 +1,156 @@
+# python_service/fingerprint_index.py
+import pickle
+import threading
+import zlib
+from collections import defaultdict
+
+import numpy as np
+
+
+def _normalize(text):
+    # Keep lowercase alphanumerics only, remembering where each came from
+    chars = []
+    offsets = []
+    for offset, char in enumerate(text):
+        if char.isalnum():
+            chars.append(char.lower())
+            offsets.append(offset)
+    return ''.join(chars), offsets
+
+
+class FingerprintIndex:
+    """Winnowing fingerprints of the latest version of every paper.
+
+    Text is reduced to lowercase alphanumerics, hashed as k-grams of
+    `kgram` characters and winnowed with a window of `window` hashes, so
+    any copied run of at least kgram + window - 1 normalized characters is
+    guaranteed to share a fingerprint. Each fingerprint keeps the character
+    span it covers in the original text, which lets a check report copied
+    passages with one hash-table lookup per fingerprint.
+    """
+
+    def __init__(self, kgram=40, window=20, min_match_chars=100, max_postings=1000):
+        self.kgram = kgram
+        self.window = window
+        self.min_match_chars = min_match_chars
+        # Fingerprints shared by more papers than this are boilerplate
+        self.max_postings = max_postings
+        self._lock = threading.RLock()
+        self._postings = defaultdict(list)
+        self._hashes_of = {}
+
+    def fingerprints(self, text):
+        normalized, offsets = _normalize(text)
+        count = len(normalized) - self.kgram + 1
+        if count <= 0:
+            return []
+        hashes = np.fromiter(
+            (zlib.crc32(normalized[i:i + self.kgram].encode('utf-8')) for i in range(count)),
+            dtype=np.uint32,
+            count=count
+        )
+        if count <= self.window:
+            positions = [int(np.argmin(hashes))]
+        else:
+            windows = np.lib.stride_tricks.sliding_window_view(hashes, self.window)
+            positions = np.unique(np.arange(len(windows)) + windows.argmin(axis=1)).tolist()
+        return [
+            (int(hashes[position]), offsets[position], offsets[position + self.kgram - 1] + 1)
+            for position in positions
+        ]
+
+    def upsert(self, bucket_hash, content):
+        fingerprints = self.fingerprints(content)
+        with self._lock:
+            self._remove(bucket_hash)
+            for fingerprint, start, end in fingerprints:
+                self._postings[fingerprint].append((bucket_hash, start, end))
+            self._hashes_of[bucket_hash] = {fingerprint for fingerprint, _, _ in fingerprints}
+
+    def matching_passages(self, content, exclude=None):
+        fingerprints = self.fingerprints(content)
+        matches = defaultdict(list)
+        with self._lock:
+            for fingerprint, start, end in fingerprints:
+                postings = self._postings.get(fingerprint)
+                if not postings or len(postings) > self.max_postings:
+                    continue
+                for bucket_hash, source_start, source_end in postings:
+                    matches[bucket_hash].append((start, end, source_start, source_end))
+
+        results = {}
+        for bucket_hash, spans in matches.items():
+            if exclude and exclude(bucket_hash):
+                continue
+            passages = self._merge(spans)
+            matched = sum(passage["submission_end"] - passage["submission_start"] for passage in passages)
+            if matched >= self.min_match_chars:
+                results[bucket_hash] = passages
+        return results
+
+    def save(self, path):
+        with self._lock:
+            postings = {fingerprint: list(spans) for fingerprint, spans in self._postings.items()}
+        with open(path, 'wb') as f:
+            pickle.dump({"params": [self.kgram, self.window], "postings": postings}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        # Returns False if the fingerprints were built with different parameters
+        with open(path, 'rb') as f:
+            state = pickle.load(f)
+        if state["params"] != [self.kgram, self.window]:
+            return False
+        postings = defaultdict(list, state["postings"])
+        hashes_of = defaultdict(set)
+        for fingerprint, spans in postings.items():
+            for bucket_hash, _, _ in spans:
+                hashes_of[bucket_hash].add(fingerprint)
+        with self._lock:
+            self._postings = postings
+            self._hashes_of = dict(hashes_of)
+        return True
+
+    def _merge(self, spans):
+        # Join fingerprints that are contiguous in both the submission and the source.
+        # Each submission fingerprint lands in at most one passage, so text repeated in
+        # the source cannot multiply the passages.
+        by_span = defaultdict(list)
+        for start, end, source_start, source_end in spans:
+            by_span[(start, end)].append((source_start, source_end))
+        passages = []
+        open_passages = []
+        for (start, end), sources in sorted(by_span.items()):
+            open_passages = [passage for passage in open_passages if start <= passage["submission_end"] + self.kgram]
+            sources.sort()
+            for passage in open_passages:
+                # Prefer the source occurrence that keeps the passage's offset into the source
+                shift = passage["source_start"] - passage["submission_start"]
+                source = min((
+                    (source_start, source_end) for source_start, source_end in sources
+                    if passage["source_start"] <= source_start <= passage["source_end"] + self.kgram
+                ), key=lambda source: abs(source[0] - start - shift), default=None)
+                if source is not None:
+                    passage["submission_end"] = max(passage["submission_end"], end)
+                    passage["source_end"] = max(passage["source_end"], source[1])
+                    break
+            else:
+                source_start, source_end = sources[0]
+                passage = {
+                    "submission_start": start,
+                    "submission_end": end,
+                    "source_start": source_start,
+                    "source_end": source_end
+                }
+                passages.append(passage)
+                open_passages.append(passage)
+        return passages
+
+    def _remove(self, bucket_hash):
+        for fingerprint in self._hashes_of.pop(bucket_hash, ()):
+            postings = self._postings.get(fingerprint)
+            if postings is None:
+                continue
+            postings[:] = [posting for posting in postings if posting[0] != bucket_hash]
+            if not postings:
+                del self._postings[fingerprint]
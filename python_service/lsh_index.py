@@ -0,0 +1,214 @@
+# python_service/lsh_index.py
+import fcntl
+import os
+import threading
+import time
+import uuid
+import zlib
+
+import numpy as np
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+class MinHashLSH:
+    """Banded MinHash index over word shingles of every stored version.
+
+    Each version is reduced to a num_perm-wide uint32 signature; signatures
+    live in one growable NumPy array and are split into `bands` bands of
+    r = num_perm / bands rows. Two versions become candidates when any band
+    matches exactly, which for shingle Jaccard similarity s happens with
+    probability
+
+        P(candidate) = 1 - (1 - s ** r) ** bands
+
+    More bands (smaller r) lowers the similarity at which papers start to
+    be retrieved, improving recall at the cost of more candidates to score
+    exactly (and more band-table memory). Recall by shingle Jaccard s with
+    num_perm=128:
+
+        bands  r   s=0.1  s=0.2  s=0.3  s=0.5  s=0.7
+        64     2   47%    93%    ~100%  100%   100%   (default)
+        32     4   0%     5%     23%    87%    100%
+        16     8   0%     0%     0%     6%     61%
+
+    Word-shingle Jaccard is much lower than TF-IDF cosine for the same pair
+    of documents: a copy with some of its lines rewritten can keep a cosine
+    near 0.9 while its 3-shingle Jaccard drops to a few percent, below what
+    any banding retrieves. The index only finds near-verbatim versions, so
+    callers should combine it with a token-overlap candidate set (see
+    CorpusIndex.candidates) rather than rely on it alone.
+    """
+
+    def __init__(self, num_perm=128, bands=64, shingle_size=3, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._lock = threading.RLock()
+        self._signatures = np.empty((0, num_perm), dtype=np.uint32)
+        self._keys = []
+        self._row_of = {}
+        self._tables = [{} for _ in range(bands)]
+        self._dirty = False
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, key):
+        return key in self._row_of
+
+    def signature(self, tokens):
+        tokens = list(tokens)
+        size = self.shingle_size
+        if len(tokens) < size:
+            shingles = {' '.join(tokens)}
+        else:
+            shingles = {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode('utf-8')) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return (permuted & _MAX_HASH).min(axis=0).astype(np.uint32)
+
+    def add(self, bucket_hash, version_index, tokens):
+        self.add_signature((bucket_hash, version_index), self.signature(tokens))
+
+    def add_signature(self, key, signature):
+        with self._lock:
+            row = self._row_of.get(key)
+            if row is None:
+                row = len(self._keys)
+                if row == len(self._signatures):
+                    grown = np.empty((max(64, 2 * row), self.num_perm), dtype=np.uint32)
+                    grown[:row] = self._signatures[:row]
+                    self._signatures = grown
+                self._keys.append(key)
+                self._row_of[key] = row
+            else:
+                self._unband(row)
+            self._signatures[row] = signature
+            self._band(row)
+            self._dirty = True
+
+    def candidates(self, tokens, limit=None):
+        signature = self.signature(tokens)
+        with self._lock:
+            rows = set()
+            for band, table in enumerate(self._tables):
+                rows.update(table.get(self._band_key(signature, band), ()))
+            # Collapse versions to buckets, keeping each bucket's best estimate
+            estimates = {}
+            for row in rows:
+                bucket_hash = self._keys[row][0]
+                estimate = float(np.mean(self._signatures[row] == signature))
+                if estimate > estimates.get(bucket_hash, -1.0):
+                    estimates[bucket_hash] = estimate
+        ranked = sorted(estimates.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:limit] if limit else ranked
+
+    def save(self, path):
+        """Write the signatures to `path`, keeping any saved there by other processes.
+
+        Several worker processes share the file: writers take an exclusive
+        flock on `<path>.lock`, merge in the signatures on disk they do not
+        hold themselves, and swap in a temporary file of their own.
+        """
+        with self._lock:
+            count = len(self._keys)
+            signatures = self._signatures[:count].copy()
+            keys = list(self._keys)
+            self._dirty = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        lock_fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(lock_fd, fcntl.LOCK_EX)
+            saved = self._read(path)
+            if saved is not None:
+                known = set(keys)
+                extra = [row for row, key in enumerate(saved[1]) if key not in known]
+                if extra:
+                    signatures = np.concatenate([signatures, saved[0][extra]])
+                    keys += [saved[1][row] for row in extra]
+            tmp_path = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            try:
+                with open(tmp_path, 'wb') as f:
+                    np.savez(
+                        f,
+                        signatures=signatures,
+                        buckets=np.array([key[0] for key in keys], dtype=str),
+                        versions=np.array([key[1] for key in keys], dtype=np.int64),
+                        params=np.array([self.num_perm, self.bands, self.shingle_size, self.seed], dtype=np.int64)
+                    )
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+        finally:
+            os.close(lock_fd)
+
+    def _read(self, path):
+        # (signatures, keys) saved at `path`, or None if missing or built with other parameters
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            params = [int(value) for value in data["params"]]
+            if params != [self.num_perm, self.bands, self.shingle_size, self.seed]:
+                print(f"Warning: Ignoring LSH signatures in {path} built with different parameters")
+                return None
+            return data["signatures"], list(zip(data["buckets"].tolist(), data["versions"].tolist()))
+
+    def load(self, path):
+        saved = self._read(path)
+        if saved is None:
+            return 0
+        signatures, keys = saved
+        with self._lock:
+            self._signatures = signatures.astype(np.uint32, copy=True)
+            self._keys = keys
+            self._row_of = {key: row for row, key in enumerate(keys)}
+            self._tables = [{} for _ in range(self.bands)]
+            for row in range(len(keys)):
+                self._band(row)
+            self._dirty = False
+        return len(keys)
+
+    def start_autosave(self, path, interval=60.0):
+        def autosave():
+            while True:
+                time.sleep(interval)
+                if not self._dirty:
+                    continue
+                try:
+                    self.save(path)
+                except Exception as e:
+                    print(f"Warning: Failed to save LSH signatures: {str(e)}")
+
+        threading.Thread(target=autosave, name="lsh-autosave", daemon=True).start()
+
+    def _band_key(self, signature, band):
+        return signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def _band(self, row):
+        signature = self._signatures[row]
+        for band, table in enumerate(self._tables):
+            table.setdefault(self._band_key(signature, band), set()).add(row)
+
+    def _unband(self, row):
+        signature = self._signatures[row]
+        for band, table in enumerate(self._tables):
+            key = self._band_key(signature, band)
+            members = table.get(key)
+            if members is not None:
+                members.discard(row)
+                if not members:
+                    del table[key]
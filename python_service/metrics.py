@@ -0,0 +1,100 @@
+# python_service/metrics.py
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds, from sub-millisecond index lookups to slow RPCs
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Histogram:
+    """Cumulative-bucket latency histogram in the Prometheus text format."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # labels -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+
+    def observe(self, seconds, *labels):
+        position = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][position] += 1
+            series[1] += seconds
+
+    def totals(self):
+        # labels -> (count, sum of seconds)
+        with self._lock:
+            return {labels: (sum(counts), total) for labels, (counts, total) in self._series.items()}
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            label_text = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(self.label_names, labels))
+            prefix = label_text + ',' if label_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{{{prefix}le="{le}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {total}")
+            lines.append(f"{self.name}_count{{{label_text}}} {cumulative}")
+        return '\n'.join(lines)
+
+
+class Metrics:
+    """Request and per-stage latency histograms for the /metrics endpoint."""
+
+    def __init__(self, prefix="plagiarism"):
+        self.requests = Histogram(
+            f"{prefix}_http_request_duration_seconds",
+            "Time spent handling HTTP requests.",
+            ("endpoint", "method", "status")
+        )
+        self.stages = Histogram(
+            f"{prefix}_stage_duration_seconds",
+            "Time spent in each stage of a plagiarism check.",
+            ("endpoint", "stage")
+        )
+        self._values = {}
+
+    @contextmanager
+    def stage(self, endpoint, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(time.perf_counter() - started, endpoint, stage)
+
+    def gauge(self, name, help_text, read):
+        # `read` is called at scrape time and returns the current value
+        self._values[name] = ("gauge", help_text, read)
+
+    def counter(self, name, help_text, read):
+        # Like gauge(), for values that only ever go up (until a restart)
+        if not name.endswith("_total"):
+            raise ValueError(f"Counter {name} must end in _total")
+        self._values[name] = ("counter", help_text, read)
+
+    def render(self):
+        parts = [self.requests.render(), self.stages.render()]
+        for name, (kind, help_text, read) in sorted(self._values.items()):
+            try:
+                value = float(read())
+            except Exception:
+                continue
+            parts.append(f"# HELP {name} {help_text}\n# TYPE {name} {kind}\n{name} {value}")
+        return '\n'.join(parts) + '\n'
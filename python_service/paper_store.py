@@ -0,0 +1,372 @@
+# python_service/paper_store.py
+import difflib
+import json
+import os
+import threading
+import zlib
+
+from sqlite_util import ThreadConnections, immediate_transaction
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS papers (
+    bucket_hash TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author_address TEXT NOT NULL,
+    version_count INTEGER NOT NULL DEFAULT 0,
+    latest_content BLOB
+);
+CREATE TABLE IF NOT EXISTS versions (
+    bucket_hash TEXT NOT NULL,
+    version_index INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    payload BLOB NOT NULL,
+    logical_size INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_hash, version_index)
+) WITHOUT ROWID;
+"""
+
+FULL = 'full'
+DELTA = 'delta'
+
+
+def _compress(text):
+    return zlib.compress(text.encode('utf-8'), 6)
+
+
+def _decompress(payload):
+    return zlib.decompress(payload).decode('utf-8')
+
+
+def encode_delta(base, content):
+    """Line-level diff of content against base as a compressed list of ops.
+
+    [0, i, j] copies base lines i:j and [1, text] inserts text.
+    """
+    base_lines = base.splitlines(keepends=True)
+    lines = content.splitlines(keepends=True)
+    ops = []
+    matcher = difflib.SequenceMatcher(None, base_lines, lines, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == 'equal':
+            ops.append([0, i1, i2])
+        elif j2 > j1:
+            ops.append([1, ''.join(lines[j1:j2])])
+    return zlib.compress(json.dumps(ops, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def apply_delta(base, payload):
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    for op in json.loads(zlib.decompress(payload)):
+        if op[0] == 0:
+            parts.extend(base_lines[op[1]:op[2]])
+        else:
+            parts.append(op[1])
+    return ''.join(parts)
+
+
+class PaperStore:
+    """Append-only SQLite (WAL) storage for papers and their versions.
+
+    Adding a version inserts one row instead of rewriting the paper's whole
+    history. Writers to the same bucket are serialized by a per-bucket lock
+    within the process and by BEGIN IMMEDIATE across processes, so
+    concurrent writers cannot drop a version. The diff is computed before
+    the write lock is taken; if another process added a version meanwhile,
+    it is recomputed against the new latest content.
+
+    Versions are stored as zlib-compressed line diffs against the previous
+    version, with a full compressed snapshot every `snapshot_interval`
+    versions (or whenever the diff would be larger). Older versions are
+    rebuilt lazily from the nearest snapshot; the latest content is kept
+    compressed on the paper row so reading it never replays deltas.
+    """
+
+    def __init__(self, db_path, snapshot_interval=16):
+        self.db_path = db_path
+        self.snapshot_interval = snapshot_interval
+        self._connections = ThreadConnections()
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._migrate_schema()
+
+    def _connection(self):
+        return self._connections.get(self.db_path)
+
+    def _transaction(self):
+        return immediate_transaction(self._connection())
+
+    def _migrate_schema(self):
+        conn = self._connection()
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+            return
+        with self._transaction() as conn:
+            columns = [row["name"] for row in conn.execute("PRAGMA table_info(versions)")]
+            legacy = "content" in columns
+            if legacy:
+                # Version 1 stored every version's full text inline
+                print("Migrating paper store to compressed delta versions...")
+                conn.execute("ALTER TABLE versions RENAME TO versions_v1")
+                conn.execute("ALTER TABLE papers ADD COLUMN latest_content BLOB")
+            for statement in SCHEMA.split(';'):
+                if statement.strip():
+                    conn.execute(statement)
+            if legacy:
+                previous = {}
+                rows = conn.execute(
+                    "SELECT bucket_hash, version_index, content, timestamp FROM versions_v1 "
+                    "ORDER BY bucket_hash, version_index"
+                )
+                for row in rows.fetchall():
+                    self._append_version(
+                        conn, row["bucket_hash"], row["version_index"], row["content"], row["timestamp"],
+                        self._encode(row["version_index"], row["content"], previous.get(row["bucket_hash"]))
+                    )
+                    previous[row["bucket_hash"]] = row["content"]
+                conn.execute("DROP TABLE versions_v1")
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        if legacy:
+            # Give the space held by the inline versions back to the filesystem
+            conn.execute("VACUUM")
+
+    def _bucket_lock(self, bucket_hash):
+        with self._locks_guard:
+            lock = self._locks.get(bucket_hash)
+            if lock is None:
+                lock = self._locks[bucket_hash] = threading.Lock()
+            return lock
+
+    def _latest(self, bucket_hash):
+        # (version_count, latest content), or (0, None) for an unknown paper
+        row = self._connection().execute(
+            "SELECT version_count, latest_content FROM papers WHERE bucket_hash = ?", (bucket_hash,)
+        ).fetchone()
+        if row is None:
+            return 0, None
+        return row["version_count"], _decompress(row["latest_content"])
+
+    def store_paper(self, bucket_hash, title, content, author_address, timestamp=0):
+        # Returns (version_index, author_address) of the stored version
+        with self._bucket_lock(bucket_hash):
+            while True:
+                version_index, previous = self._latest(bucket_hash)
+                encoded = self._encode(version_index, content, previous)
+                with self._transaction() as conn:
+                    paper = conn.execute(
+                        "SELECT author_address, version_count FROM papers WHERE bucket_hash = ?", (bucket_hash,)
+                    ).fetchone()
+                    if (paper["version_count"] if paper else 0) == version_index:
+                        if paper is None:
+                            conn.execute(
+                                "INSERT INTO papers (bucket_hash, title, author_address, version_count) "
+                                "VALUES (?, ?, ?, 0)",
+                                (bucket_hash, title, author_address)
+                            )
+                        elif paper["author_address"] != author_address:
+                            author_address = author_address + " (shared)"
+                            conn.execute(
+                                "UPDATE papers SET author_address = ? WHERE bucket_hash = ?",
+                                (author_address, bucket_hash)
+                            )
+                        else:
+                            author_address = paper["author_address"]
+                        self._append_version(conn, bucket_hash, version_index, content, timestamp, encoded)
+                        return version_index, author_address
+                # Another process stored a version since we read; diff against that one
+
+    def add_version(self, bucket_hash, content, timestamp=0):
+        # Returns the new version index, or None if the paper does not exist
+        with self._bucket_lock(bucket_hash):
+            while True:
+                version_index, previous = self._latest(bucket_hash)
+                if previous is None:
+                    return None
+                encoded = self._encode(version_index, content, previous)
+                with self._transaction() as conn:
+                    current = conn.execute(
+                        "SELECT version_count FROM papers WHERE bucket_hash = ?", (bucket_hash,)
+                    ).fetchone()
+                    if current["version_count"] == version_index:
+                        self._append_version(conn, bucket_hash, version_index, content, timestamp, encoded)
+                        return version_index
+                # Another process added a version since we read; diff against that one
+
+    def _encode(self, version_index, content, previous):
+        # (kind, payload, compressed content); called outside the write transaction
+        compressed = _compress(content)
+        kind, payload = FULL, compressed
+        if previous is not None and version_index % self.snapshot_interval:
+            delta = encode_delta(previous, content)
+            if len(delta) < len(compressed):
+                kind, payload = DELTA, delta
+        return kind, payload, compressed
+
+    def _append_version(self, conn, bucket_hash, version_index, content, timestamp, encoded):
+        kind, payload, compressed = encoded
+        conn.execute(
+            "INSERT INTO versions (bucket_hash, version_index, kind, payload, logical_size, timestamp) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (bucket_hash, version_index, kind, payload, len(content.encode('utf-8')), timestamp or 0)
+        )
+        conn.execute(
+            "UPDATE papers SET version_count = ?, latest_content = ? WHERE bucket_hash = ?",
+            (version_index + 1, compressed, bucket_hash)
+        )
+
+    def get_paper(self, bucket_hash, start=0, end=None):
+        """Paper metadata plus versions[start:end] (negative indices count from the end)."""
+        conn = self._connection()
+        paper = conn.execute(
+            "SELECT title, author_address, version_count, latest_content FROM papers WHERE bucket_hash = ?",
+            (bucket_hash,)
+        ).fetchone()
+        if paper is None:
+            return None
+        version_count = paper["version_count"]
+        latest = _decompress(paper["latest_content"])
+        start, end, _ = slice(start, end).indices(version_count)
+        if start == version_count - 1 and end == version_count:
+            versions = [self._latest_version(bucket_hash, version_count, latest)]
+        else:
+            versions = self.get_versions(bucket_hash, start, end)
+        return {
+            "bucket_hash": bucket_hash,
+            "title": paper["title"],
+            "content": latest,
+            "author_address": paper["author_address"],
+            "version_count": version_count,
+            "versions": versions
+        }
+
+    def _latest_version(self, bucket_hash, version_count, latest):
+        row = self._connection().execute(
+            "SELECT timestamp FROM versions WHERE bucket_hash = ? AND version_index = ?",
+            (bucket_hash, version_count - 1)
+        ).fetchone()
+        return {"version_index": version_count - 1, "content": latest, "timestamp": row["timestamp"]}
+
+    def get_versions(self, bucket_hash, start, end):
+        if end <= start:
+            return []
+        conn = self._connection()
+        # Replay from the closest snapshot at or before `start`
+        snapshot = conn.execute(
+            "SELECT MAX(version_index) FROM versions WHERE bucket_hash = ? AND kind = ? AND version_index <= ?",
+            (bucket_hash, FULL, start)
+        ).fetchone()[0]
+        rows = conn.execute(
+            "SELECT version_index, kind, payload, timestamp FROM versions "
+            "WHERE bucket_hash = ? AND version_index >= ? AND version_index < ? ORDER BY version_index",
+            (bucket_hash, snapshot or 0, end)
+        ).fetchall()
+        versions = []
+        content = None
+        for row in rows:
+            if row["kind"] == FULL:
+                content = _decompress(row["payload"])
+            else:
+                content = apply_delta(content, row["payload"])
+            if row["version_index"] >= start:
+                versions.append({
+                    "version_index": row["version_index"],
+                    "content": content,
+                    "timestamp": row["timestamp"]
+                })
+        return versions
+
+    def list_buckets(self):
+        rows = self._connection().execute("SELECT bucket_hash FROM papers ORDER BY bucket_hash").fetchall()
+        return [row["bucket_hash"] for row in rows]
+
+    def data_version(self):
+        # Changes whenever another connection (or process) commits to the database
+        return self._connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def version_counts(self):
+        rows = self._connection().execute("SELECT bucket_hash, version_count FROM papers").fetchall()
+        return {row["bucket_hash"]: row["version_count"] for row in rows}
+
+    def iter_latest(self):
+        rows = self._connection().execute(
+            "SELECT bucket_hash, title, author_address, version_count, latest_content FROM papers"
+        )
+        for row in rows:
+            paper = dict(row)
+            paper["content"] = _decompress(paper.pop("latest_content"))
+            yield paper
+
+    def stats(self):
+        conn = self._connection()
+        versions = conn.execute(
+            "SELECT COUNT(*) AS versions, COALESCE(SUM(logical_size), 0) AS logical_bytes, "
+            "COALESCE(SUM(LENGTH(payload)), 0) AS version_bytes, "
+            "COALESCE(SUM(kind = 'full'), 0) AS snapshots FROM versions"
+        ).fetchone()
+        papers = conn.execute(
+            "SELECT COUNT(*) AS papers, COALESCE(SUM(LENGTH(latest_content)), 0) AS latest_bytes FROM papers"
+        ).fetchone()
+        database_bytes = sum(
+            os.path.getsize(path) for path in (self.db_path, f"{self.db_path}-wal")
+            if os.path.exists(path)
+        )
+        logical_bytes = versions["logical_bytes"]
+        stored_bytes = versions["version_bytes"] + papers["latest_bytes"]
+        return {
+            "papers": papers["papers"],
+            "versions": versions["versions"],
+            "snapshots": versions["snapshots"],
+            "logical_bytes": logical_bytes,
+            "stored_bytes": stored_bytes,
+            "database_bytes": database_bytes,
+            "stored_to_logical_ratio": stored_bytes / logical_bytes if logical_bytes else 0.0,
+            "disk_to_logical_ratio": database_bytes / logical_bytes if logical_bytes else 0.0
+        }
+
+    def migrate_json_dir(self, papers_dir):
+        """Import legacy papers/<bucket_hash>.json files not yet in the store.
+
+        The JSON files are left in place; buckets already in the database are
+        skipped without being parsed, so this is cheap to run on every start.
+        """
+        if not os.path.isdir(papers_dir):
+            return 0
+        known = set(self.list_buckets())
+        migrated = 0
+        for filename in os.listdir(papers_dir):
+            if not filename.endswith(".json") or os.path.splitext(filename)[0] in known:
+                continue
+            try:
+                with open(os.path.join(papers_dir, filename), 'r') as f:
+                    paper_data = json.load(f)
+            except Exception as e:
+                print(f"Warning: Skipping unreadable paper {filename}: {str(e)}")
+                continue
+            bucket_hash = paper_data.get("bucket_hash") or os.path.splitext(filename)[0]
+            versions = paper_data.get("versions") or [
+                {"content": paper_data.get("content", ""), "timestamp": 0}
+            ]
+            encoded = []
+            previous = None
+            for version_index, version in enumerate(versions):
+                content = version.get("content", "")
+                encoded.append(self._encode(version_index, content, previous))
+                previous = content
+            with self._bucket_lock(bucket_hash), self._transaction() as conn:
+                inserted = conn.execute(
+                    "INSERT OR IGNORE INTO papers (bucket_hash, title, author_address, version_count) "
+                    "VALUES (?, ?, ?, 0)",
+                    (bucket_hash, paper_data.get("title", ""), paper_data.get("author_address", ""))
+                ).rowcount
+                if not inserted:
+                    continue
+                for version_index, version in enumerate(versions):
+                    self._append_version(
+                        conn, bucket_hash, version_index, version.get("content", ""), version.get("timestamp", 0),
+                        encoded[version_index]
+                    )
+            migrated += 1
+        return migrated
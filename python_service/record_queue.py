@@ -0,0 +1,263 @@
+# python_service/record_queue.py
+import fcntl
+import os
+import threading
+import time
+import uuid
+
+from web3 import Web3
+from web3.exceptions import ContractLogicError, TransactionNotFound
+
+from chain_client import CircuitBreaker
+from sqlite_util import ThreadConnections
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS record_receipts (
+    receipt_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    author TEXT NOT NULL,
+    similarity INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    tx_hash TEXT,
+    block_number INTEGER,
+    error TEXT,
+    queued_at REAL NOT NULL,
+    next_attempt_at REAL NOT NULL,
+    submitted_at REAL,
+    nonce INTEGER,
+    raw_tx BLOB
+);
+CREATE INDEX IF NOT EXISTS record_receipts_status ON record_receipts (status, next_attempt_at);
+"""
+
+RECEIPT_COLUMNS = "receipt_id, status, author, similarity, attempts, tx_hash, block_number, error, queued_at"
+
+# Added after the table first shipped
+LATER_COLUMNS = {"nonce": "INTEGER", "raw_tx": "BLOB"}
+
+# Node answers to a rebroadcast meaning the transaction is already in the pool or mined
+ALREADY_SENT_ERRORS = ("already known", "known transaction", "nonce too low", "already imported")
+
+
+class RecordCheckQueue:
+    """Background submitter for PlagiarismChecker.recordCheck transactions.
+
+    Requests get a receipt id immediately and poll its status. Receipts are
+    kept in a SQLite (WAL) table at `db_path`, so any worker process can
+    queue a check or report on one. Only one process sends: its worker
+    thread holds an exclusive lock on `<db_path>.lock` (the others keep
+    trying, in case it exits), which keeps the locally tracked nonces from
+    colliding. The sender drains up to `batch_size` queued checks, sends
+    them back to back so they are pipelined into the same blocks, and polls
+    their receipts on later passes. Node errors are retried with
+    exponential backoff; reverts are final.
+
+    Each transaction is signed and stored with its nonce and hash before it
+    is broadcast. A retry, also after a crash, rebroadcasts the same signed
+    transaction, so a send the node accepted despite an error is never
+    mined twice. Without a private key the node signs for its unlocked
+    account (eth_signTransaction).
+
+    Statuses: queued -> submitted -> confirmed | failed.
+    """
+
+    def __init__(self, chain_client, db_path, sender=None, private_key=None, batch_size=16,
+                 max_attempts=5, backoff=2.0, confirm_timeout=600.0, max_receipts=10000):
+        self.chain = chain_client
+        self.db_path = db_path
+        self.private_key = private_key
+        self.sender = sender
+        if private_key and not sender:
+            self.sender = chain_client.w3.eth.account.from_key(private_key).address
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.confirm_timeout = confirm_timeout
+        self.max_receipts = max_receipts
+        self.breaker = CircuitBreaker()
+        self._connections = ThreadConnections()
+        self._wakeup = threading.Event()
+        self._lock_fd = None
+        self._nonce = None
+        self._thread = None
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(record_receipts)")}
+        for name, column_type in LATER_COLUMNS.items():
+            if name not in existing:
+                conn.execute(f"ALTER TABLE record_receipts ADD COLUMN {name} {column_type}")
+
+    def _connection(self):
+        return self._connections.get(self.db_path)
+
+    def _call(self, fn, *args, **kwargs):
+        return self.chain.call_with(self.breaker, fn, *args, **kwargs)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="record-check-queue", daemon=True)
+            self._thread.start()
+
+    def submit(self, author_address, similarity):
+        receipt_id = uuid.uuid4().hex
+        now = time.time()
+        self._connection().execute(
+            "INSERT INTO record_receipts (receipt_id, status, author, similarity, attempts, queued_at, next_attempt_at) "
+            "VALUES (?, 'queued', ?, ?, 0, ?, ?)",
+            (receipt_id, author_address, int(round(similarity)), now, now)
+        )
+        self._wakeup.set()
+        return receipt_id
+
+    def status(self, receipt_id):
+        row = self._connection().execute(
+            f"SELECT {RECEIPT_COLUMNS} FROM record_receipts WHERE receipt_id = ?", (receipt_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def _update(self, receipt_id, **fields):
+        assignments = ', '.join(f"{name} = ?" for name in fields)
+        self._connection().execute(
+            f"UPDATE record_receipts SET {assignments} WHERE receipt_id = ?", tuple(fields.values()) + (receipt_id,)
+        )
+
+    def _trim(self):
+        # Forget the oldest finished receipts once we hold too many
+        self._connection().execute(
+            "DELETE FROM record_receipts WHERE receipt_id IN ("
+            "SELECT receipt_id FROM record_receipts WHERE status IN ('confirmed', 'failed') ORDER BY queued_at "
+            "LIMIT MAX(0, (SELECT COUNT(*) FROM record_receipts) - ?))",
+            (self.max_receipts,)
+        )
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(1.0)
+            self._wakeup.clear()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Warning: recordCheck queue error: {str(e)}")
+
+    def run_once(self):
+        """One pass of the sender; returns False if another process is the sender."""
+        if not self._acquire_sender_lock():
+            return False
+        self._check_unconfirmed()
+        batch = self._take_batch()
+        if batch:
+            self._send_batch(batch)
+        self._trim()
+        return True
+
+    def _acquire_sender_lock(self):
+        if self._lock_fd is None:
+            fd = os.open(f"{self.db_path}.lock", os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                os.close(fd)
+                return False
+            # Held until the process exits
+            self._lock_fd = fd
+        return True
+
+    def _take_batch(self):
+        rows = self._connection().execute(
+            # Signed transactions first, so their nonces are filled before new ones are taken
+            "SELECT receipt_id, author, similarity, attempts, tx_hash, raw_tx FROM record_receipts "
+            "WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY raw_tx IS NULL, next_attempt_at LIMIT ?",
+            (time.time(), self.batch_size)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _retry_or_fail(self, receipt_id, attempts, error, signed=False):
+        if attempts >= self.max_attempts:
+            if signed:
+                # The node may have accepted it regardless; its receipt decides
+                self._update(receipt_id, status="submitted", submitted_at=time.time(), error=str(error))
+            else:
+                self._update(receipt_id, status="failed", error=str(error))
+            return
+        delay = self.backoff * (2 ** (attempts - 1))
+        self._update(receipt_id, error=str(error), next_attempt_at=time.time() + delay)
+
+    def _next_nonce(self):
+        if self._nonce is None:
+            self._nonce = self._call(self.chain.w3.eth.get_transaction_count, self.sender, 'pending')
+        nonce = self._nonce
+        self._nonce += 1
+        return nonce
+
+    def _send_batch(self, batch):
+        for receipt in batch:
+            receipt_id = receipt["receipt_id"]
+            attempts = receipt["attempts"] + 1
+            self._update(receipt_id, attempts=attempts)
+            try:
+                if receipt["raw_tx"] is None:
+                    if self.sender is None:
+                        # No key configured: use the node's first unlocked account (Ganache)
+                        self.sender = self._call(lambda: self.chain.w3.eth.accounts[0])
+                    receipt.update(self._sign(receipt_id, receipt["author"], receipt["similarity"]))
+                self._broadcast(receipt["raw_tx"])
+            except ContractLogicError as e:
+                # recordCheck reverted (banned or out of checks); retrying will not help
+                self._update(receipt_id, status="failed", error=str(e))
+                continue
+            except Exception as e:
+                if receipt["raw_tx"] is None:
+                    # Nonce may be out of sync after a failed build; re-read it next time
+                    self._nonce = None
+                self._retry_or_fail(receipt_id, attempts, e, signed=receipt["raw_tx"] is not None)
+                continue
+            self._update(receipt_id, status="submitted", submitted_at=time.time(), error=None)
+
+    def _sign(self, receipt_id, author_address, similarity):
+        # Signs a recordCheck transaction and stores it on the receipt before anything is sent
+        function = self.chain.contract.functions.recordCheck(Web3.to_checksum_address(author_address), similarity)
+        nonce = self._next_nonce()
+        transaction = self._call(function.build_transaction, {"from": self.sender, "nonce": nonce})
+        if self.private_key:
+            raw_tx = self.chain.w3.eth.account.sign_transaction(transaction, self.private_key).rawTransaction
+        else:
+            raw_tx = self._call(self.chain.w3.eth.sign_transaction, transaction)["raw"]
+        signed = {"nonce": nonce, "raw_tx": bytes(raw_tx), "tx_hash": Web3.to_hex(Web3.keccak(raw_tx))}
+        self._update(receipt_id, **signed)
+        return signed
+
+    def _broadcast(self, raw_tx):
+        try:
+            self._call(self.chain.w3.eth.send_raw_transaction, raw_tx)
+        except Exception as e:
+            if not any(message in str(e).lower() for message in ALREADY_SENT_ERRORS):
+                raise
+
+    def _check_unconfirmed(self):
+        rows = self._connection().execute(
+            "SELECT receipt_id, author, tx_hash, submitted_at FROM record_receipts WHERE status = 'submitted'"
+        ).fetchall()
+        for row in rows:
+            try:
+                # Not through a breaker: a transaction still pending says nothing about the node
+                tx_receipt = self.chain.w3.eth.get_transaction_receipt(row["tx_hash"])
+            except TransactionNotFound:
+                if time.time() - row["submitted_at"] > self.confirm_timeout:
+                    self._update(row["receipt_id"], status="failed", error=f"Transaction {row['tx_hash']} was never mined")
+                continue
+            except Exception as e:
+                print(f"Warning: Could not fetch receipt for {row['tx_hash']}: {str(e)}")
+                continue
+            self._finish(row, tx_receipt)
+
+    def _finish(self, row, tx_receipt):
+        if tx_receipt["status"] == 1:
+            self._update(row["receipt_id"], status="confirmed", block_number=tx_receipt["blockNumber"])
+        else:
+            self._update(
+                row["receipt_id"], status="failed", block_number=tx_receipt["blockNumber"], error="Transaction reverted"
+            )
+        self.chain.invalidate_author(row["author"])
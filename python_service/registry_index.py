@@ -0,0 +1,258 @@
+# python_service/registry_index.py
+import os
+import threading
+import time
+
+from chain_client import CircuitBreaker
+from sqlite_util import ThreadConnections, immediate_transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS registry_papers (
+    bucket_hash TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    author_address TEXT NOT NULL,
+    version_count INTEGER NOT NULL DEFAULT 1,
+    content_hash TEXT,
+    block_number INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS registry_papers_title ON registry_papers (title);
+CREATE INDEX IF NOT EXISTS registry_papers_author ON registry_papers (author_address, block_number);
+CREATE TABLE IF NOT EXISTS registry_versions (
+    bucket_hash TEXT NOT NULL,
+    version_number INTEGER NOT NULL,
+    content_hash TEXT,
+    block_number INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    PRIMARY KEY (bucket_hash, version_number)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS registry_checkpoint (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    contract_address TEXT NOT NULL,
+    last_block INTEGER NOT NULL
+);
+"""
+
+PAPER_REGISTERED = "PaperRegistered(string,string,address,uint256)"
+VERSION_ADDED = "VersionAdded(string,string,uint256,uint256)"
+
+PAPER_COLUMNS = "bucket_hash, title, author_address, version_count, content_hash, block_number, timestamp"
+
+
+class RegistryIndex:
+    """Local SQLite mirror of the AcademicPaperRegistry contract.
+
+    A background thread follows PaperRegistered and VersionAdded logs in
+    ranges of up to `batch_blocks` blocks, starting from the checkpoint
+    saved with the last applied range, so reads (title lookups, an
+    author's papers, a paper's versions) never go to the node. Each range
+    and its checkpoint are committed in one transaction, which makes
+    re-processing after a crash harmless. Node calls go through the
+    indexer's own circuit breaker, never the one guarding checks.
+
+    PaperRegistered does not carry the content hash, so version 1 is kept
+    without one and a paper's content_hash is only known once it has had
+    a VersionAdded.
+    """
+
+    def __init__(self, db_path, contract=None, chain_client=None, start_block=0,
+                 batch_blocks=2000, confirmations=0, store_db_path=None):
+        self.db_path = db_path
+        self.start_block = start_block
+        self.batch_blocks = batch_blocks
+        self.confirmations = confirmations
+        self.store_db_path = store_db_path
+        self._connections = ThreadConnections(setup=self._attach_store)
+        self._thread = None
+        self.breaker = CircuitBreaker()
+        self.attach(contract, chain_client)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        conn = self._connection()
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+    def _connection(self):
+        return self._connections.get(self.db_path)
+
+    def _attach_store(self, conn):
+        if self.store_db_path:
+            # Lets reconcile() join against the paper store without copying it
+            conn.execute("ATTACH DATABASE ? AS store", (self.store_db_path,))
+
+    def attach(self, contract, chain_client):
+        # The contract may only be known after start-up; reads work without it
+        self.contract = contract
+        self.chain = chain_client
+        self._topics = {}
+        if contract is not None:
+            self._topics = {
+                contract.w3.keccak(text=PAPER_REGISTERED): "PaperRegistered",
+                contract.w3.keccak(text=VERSION_ADDED): "VersionAdded"
+            }
+
+    def _transaction(self):
+        return immediate_transaction(self._connection())
+
+    def checkpoint(self):
+        row = self._connection().execute(
+            "SELECT contract_address, last_block FROM registry_checkpoint WHERE id = 1"
+        ).fetchone()
+        if row is None or self.contract is None or row["contract_address"] != self.contract.address:
+            return None
+        return row["last_block"]
+
+    def start(self, poll_interval=5.0):
+        if self._thread is None and self.contract is not None:
+            self._thread = threading.Thread(
+                target=self._run, args=(poll_interval,), name="registry-index", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, poll_interval):
+        while True:
+            try:
+                # Keep going without sleeping while we are catching up
+                if not self.sync_once():
+                    time.sleep(poll_interval)
+            except Exception as e:
+                print(f"Warning: Registry indexer error: {str(e)}")
+                time.sleep(poll_interval)
+
+    def sync_once(self):
+        """Apply the next block range; returns True if more blocks are waiting."""
+        last_block = self.checkpoint()
+        if last_block is None:
+            self._reset()
+            last_block = self.start_block - 1
+        head = self.chain.call_with(self.breaker, lambda: self.chain.w3.eth.block_number) - self.confirmations
+        if head <= last_block:
+            return False
+        from_block = last_block + 1
+        to_block = min(head, from_block + self.batch_blocks - 1)
+        logs = self._get_logs(from_block, to_block)
+        with self._transaction() as conn:
+            for log in logs:
+                self._apply(conn, log)
+            conn.execute(
+                "INSERT OR REPLACE INTO registry_checkpoint (id, contract_address, last_block) VALUES (1, ?, ?)",
+                (self.contract.address, to_block)
+            )
+        return to_block < head
+
+    def _get_logs(self, from_block, to_block):
+        try:
+            return self.chain.call_with(self.breaker, self.chain.w3.eth.get_logs, {
+                "address": self.contract.address,
+                "fromBlock": from_block,
+                "toBlock": to_block,
+                "topics": [[self.contract.w3.to_hex(topic) for topic in self._topics]]
+            })
+        except ValueError:
+            # Providers reject ranges with too many results; split and try again,
+            # and keep later batches within the size that worked
+            if from_block == to_block:
+                raise
+            self.batch_blocks = max(1, min(self.batch_blocks, (to_block - from_block + 1) // 2))
+            middle = (from_block + to_block) // 2
+            return self._get_logs(from_block, middle) + self._get_logs(middle + 1, to_block)
+
+    def _apply(self, conn, log):
+        name = self._topics.get(bytes(log["topics"][0]))
+        if name is None:
+            return
+        args = getattr(self.contract.events, name)().process_log(log)["args"]
+        if name == "PaperRegistered":
+            conn.execute(
+                "INSERT OR IGNORE INTO registry_papers "
+                "(bucket_hash, title, author_address, version_count, content_hash, block_number, timestamp) "
+                "VALUES (?, ?, ?, 1, NULL, ?, ?)",
+                (args["bucketHash"], args["title"], args["author"].lower(), log["blockNumber"], args["timestamp"])
+            )
+            conn.execute(
+                "INSERT OR IGNORE INTO registry_versions "
+                "(bucket_hash, version_number, content_hash, block_number, timestamp) VALUES (?, 1, NULL, ?, ?)",
+                (args["bucketHash"], log["blockNumber"], args["timestamp"])
+            )
+        else:
+            conn.execute(
+                "INSERT OR IGNORE INTO registry_versions "
+                "(bucket_hash, version_number, content_hash, block_number, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (args["bucketHash"], args["versionNumber"], args["contentHash"], log["blockNumber"], args["timestamp"])
+            )
+            conn.execute(
+                "UPDATE registry_papers SET version_count = MAX(version_count, ?), "
+                "content_hash = CASE WHEN version_count <= ? THEN ? ELSE content_hash END WHERE bucket_hash = ?",
+                (args["versionNumber"], args["versionNumber"], args["contentHash"], args["bucketHash"])
+            )
+
+    def _reset(self):
+        # New deployment (or first run): the old rows describe another contract
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM registry_papers")
+            conn.execute("DELETE FROM registry_versions")
+            conn.execute("DELETE FROM registry_checkpoint")
+
+    def get_paper(self, bucket_hash):
+        row = self._connection().execute(
+            f"SELECT {PAPER_COLUMNS} FROM registry_papers WHERE bucket_hash = ?", (bucket_hash,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def find_by_title(self, title):
+        # Titles are unique on chain (registerPaper requires it)
+        row = self._connection().execute(
+            f"SELECT {PAPER_COLUMNS} FROM registry_papers WHERE title = ?", (title,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def list_papers(self, offset=0, limit=50, author_address=None):
+        # Returns (papers, total) in registration order
+        conn = self._connection()
+        where, params = "", ()
+        if author_address:
+            where, params = "WHERE author_address = ?", (author_address.lower(),)
+        total = conn.execute(f"SELECT COUNT(*) FROM registry_papers {where}", params).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT {PAPER_COLUMNS} FROM registry_papers {where} ORDER BY block_number, rowid LIMIT ? OFFSET ?",
+            params + (limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows], total
+
+    def get_versions(self, bucket_hash, offset=0, limit=50):
+        rows = self._connection().execute(
+            "SELECT version_number, content_hash, block_number, timestamp FROM registry_versions "
+            "WHERE bucket_hash = ? ORDER BY version_number LIMIT ? OFFSET ?",
+            (bucket_hash, limit, offset)
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def reconcile(self, limit=100):
+        """Differences between the chain registry and the paper store, as one local join each."""
+        if not self.store_db_path:
+            return None
+        conn = self._connection()
+        missing_content = conn.execute(
+            "SELECT r.bucket_hash, r.title, r.author_address FROM registry_papers r "
+            "LEFT JOIN store.papers p ON p.bucket_hash = r.bucket_hash "
+            "WHERE p.bucket_hash IS NULL ORDER BY r.block_number LIMIT ?",
+            (limit,)
+        ).fetchall()
+        unregistered = conn.execute(
+            "SELECT p.bucket_hash, p.title, p.author_address FROM store.papers p "
+            "LEFT JOIN registry_papers r ON r.bucket_hash = p.bucket_hash "
+            "WHERE r.bucket_hash IS NULL ORDER BY p.bucket_hash LIMIT ?",
+            (limit,)
+        ).fetchall()
+        version_mismatch = conn.execute(
+            "SELECT r.bucket_hash, r.version_count AS registry_versions, p.version_count AS stored_versions "
+            "FROM registry_papers r JOIN store.papers p ON p.bucket_hash = r.bucket_hash "
+            "WHERE r.version_count != p.version_count ORDER BY r.block_number LIMIT ?",
+            (limit,)
+        ).fetchall()
+        return {
+            "checkpoint_block": self.checkpoint(),
+            "registered_without_content": [dict(row) for row in missing_content],
+            "stored_without_registration": [dict(row) for row in unregistered],
+            "version_count_mismatch": [dict(row) for row in version_mismatch]
+        }
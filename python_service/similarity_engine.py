@@ -0,0 +1,290 @@
+# python_service/similarity_engine.py
+import os
+import pickle
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+SNAPSHOT_FORMAT = 1
+
+
+def _tfidf_vectorizer():
+    # scikit-learn is slow to import; defer it until the first fit
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    return TfidfVectorizer()
+
+
+class SimilarityEngine:
+    """Corpus-wide TF-IDF similarity over the latest version of every paper.
+
+    The vocabulary/IDF and the L2-normalized document matrix are refit by a
+    background thread. Papers stored since the last refit are transformed
+    with the current vocabulary and kept as pending rows, so a query is one
+    sparse matrix-vector product plus a small pending block.
+    """
+
+    def __init__(self, refit_threshold=50, refit_interval=30.0):
+        self.refit_threshold = refit_threshold
+        self.refit_interval = refit_interval
+        self._lock = threading.RLock()
+        self._refit_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._docs = {}
+        self._doc_seq = {}
+        self._seq = 0
+        self._vectorizer = None
+        self._matrix = None
+        self._row_buckets = []
+        self._row_of = {}
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._docs)
+
+    def fitted(self):
+        with self._lock:
+            return self._vectorizer is not None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refit_loop, name="similarity-refit", daemon=True)
+            self._thread.start()
+
+    def upsert(self, bucket_hash, processed_text):
+        with self._lock:
+            self._seq += 1
+            self._docs[bucket_hash] = processed_text
+            self._doc_seq[bucket_hash] = self._seq
+            vectorizer = self._vectorizer
+            if vectorizer is not None:
+                self._pending[bucket_hash] = vectorizer.transform([processed_text])
+            if len(self._pending) >= self.refit_threshold or vectorizer is None:
+                self._wakeup.set()
+
+    def refit(self):
+        with self._refit_lock:
+            with self._lock:
+                seq = self._seq
+                buckets = list(self._docs)
+                texts = [self._docs[bucket_hash] for bucket_hash in buckets]
+            if not texts:
+                return
+            vectorizer = _tfidf_vectorizer()
+            try:
+                matrix = vectorizer.fit_transform(texts).tocsr()
+            except ValueError:
+                # Every stored document preprocessed to an empty string
+                return
+            with self._lock:
+                self._vectorizer = vectorizer
+                self._matrix = matrix
+                self._row_buckets = buckets
+                self._row_of = {bucket_hash: row for row, bucket_hash in enumerate(buckets)}
+                # Anything stored while we were fitting must be re-transformed
+                self._pending = {
+                    bucket_hash: vectorizer.transform([self._docs[bucket_hash]])
+                    for bucket_hash, doc_seq in self._doc_seq.items()
+                    if doc_seq > seq
+                }
+
+    def top_k(self, processed_text, k=5, exclude=None, candidates=None):
+        # With candidates, only those papers are scored (e.g. from the LSH index)
+        with self._lock:
+            vectorizer = self._vectorizer
+            matrix = self._matrix
+            row_buckets = self._row_buckets
+            pending = dict(self._pending)
+            if candidates is not None:
+                candidates = set(candidates)
+                pending = {
+                    bucket_hash: vector for bucket_hash, vector in pending.items()
+                    if bucket_hash in candidates
+                }
+                rows = np.array(sorted(
+                    self._row_of[bucket_hash] for bucket_hash in candidates
+                    if bucket_hash in self._row_of
+                ), dtype=np.intp)
+                row_buckets = [row_buckets[row] for row in rows]
+                matrix = matrix[rows] if matrix is not None else None
+        if vectorizer is None:
+            return []
+        query = vectorizer.transform([processed_text])
+        if query.nnz == 0:
+            return []
+
+        if matrix is not None:
+            scores = (matrix @ query.T).toarray().ravel()
+            rows = np.flatnonzero(scores > 0)
+            values = scores[rows]
+        else:
+            rows = values = np.empty(0)
+        pending_scores = {
+            bucket_hash: float((vector @ query.T).toarray()[0][0])
+            for bucket_hash, vector in pending.items()
+        }
+        return self._rank(rows, values, row_buckets, pending_scores, k, exclude)
+
+    def top_k_many(self, processed_texts, k=5, excludes=None, candidates=None, chunk_size=32):
+        """top_k for several submissions.
+
+        Submissions with a candidate set (a None entry means the whole
+        corpus) are scored through top_k. The rest share one matrix product
+        per `chunk_size` submissions, so at most chunk_size x corpus scores
+        are held at once, and only the best rows of each are ranked.
+        """
+        results = [None] * len(processed_texts)
+        scan = []
+        for position, processed_text in enumerate(processed_texts):
+            exclude = excludes[position] if excludes else None
+            if candidates is not None and candidates[position] is not None:
+                results[position] = self.top_k(processed_text, k=k, exclude=exclude, candidates=candidates[position])
+            else:
+                scan.append(position)
+        with self._lock:
+            vectorizer = self._vectorizer
+            matrix = self._matrix
+            row_buckets = self._row_buckets
+            pending = dict(self._pending)
+        if vectorizer is None:
+            return [result if result is not None else [] for result in results]
+        pending_buckets = list(pending)
+        pending_matrix = sp.vstack([pending[bucket_hash] for bucket_hash in pending_buckets]) if pending else None
+
+        for start in range(0, len(scan), chunk_size):
+            chunk = scan[start:start + chunk_size]
+            queries = vectorizer.transform([processed_texts[position] for position in chunk])
+            corpus_scores = (queries @ matrix.T).toarray() if matrix is not None else None
+            pending_scores = (queries @ pending_matrix.T).toarray() if pending_matrix is not None else None
+            for offset, position in enumerate(chunk):
+                exclude = excludes[position] if excludes else None
+                row_pending = {}
+                if pending_scores is not None:
+                    row_pending = dict(zip(pending_buckets, pending_scores[offset].tolist()))
+                if corpus_scores is None:
+                    results[position] = self._rank(np.empty(0), np.empty(0), row_buckets, row_pending, k, exclude)
+                    continue
+                scores = corpus_scores[offset]
+                positive = np.flatnonzero(scores > 0)
+                rows = positive
+                # Pending rows shadow their stale matrix rows, so leave room for them
+                limit = 2 * k + len(row_pending)
+                if len(positive) > limit:
+                    rows = positive[np.argpartition(-scores[positive], limit)[:limit]]
+                ranked = self._rank(rows, scores[rows], row_buckets, row_pending, k, exclude)
+                if len(ranked) < k and len(rows) < len(positive):
+                    # Excluded papers used up the headroom; rank every scored row
+                    ranked = self._rank(positive, scores[positive], row_buckets, row_pending, k, exclude)
+                results[position] = ranked
+        return results
+
+    def _rank(self, rows, values, row_buckets, pending_scores, k, exclude):
+        # rows/values are the matrix rows with a positive score; pending rows override them
+        results = {}
+        for order in np.argsort(-values):
+            if len(results) >= k + len(pending_scores):
+                break
+            bucket_hash = row_buckets[rows[order]]
+            if bucket_hash in pending_scores or (exclude and exclude(bucket_hash)):
+                continue
+            results[bucket_hash] = float(values[order])
+        for bucket_hash, score in pending_scores.items():
+            if score > 0 and not (exclude and exclude(bucket_hash)):
+                results[bucket_hash] = score
+
+        ranked = sorted(results.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(bucket_hash, score * 100) for bucket_hash, score in ranked]
+
+    def score(self, processed_text, bucket_hash):
+        with self._lock:
+            vectorizer = self._vectorizer
+            vector = self._pending.get(bucket_hash)
+            if vector is None and bucket_hash in self._row_of:
+                vector = self._matrix[self._row_of[bucket_hash]]
+        if vectorizer is None or vector is None:
+            return 0.0
+        query = vectorizer.transform([processed_text])
+        return float((vector @ query.T).toarray()[0][0]) * 100
+
+    def save(self, path):
+        """Write the fitted state to the directory `path`.
+
+        The CSR arrays are plain .npy files so load() can memory-map them;
+        the vectorizer and the documents (needed for the next refit) are
+        pickled.
+        """
+        with self._lock:
+            matrix = self._matrix
+            state = {
+                "format": SNAPSHOT_FORMAT,
+                "vectorizer": self._vectorizer,
+                "row_buckets": list(self._row_buckets),
+                "docs": dict(self._docs),
+                "pending": list(self._pending),
+                "shape": matrix.shape if matrix is not None else None
+            }
+        os.makedirs(path, exist_ok=True)
+        if matrix is not None:
+            for name in ("data", "indices", "indptr"):
+                np.save(os.path.join(path, f"matrix_{name}.npy"), getattr(matrix, name))
+        with open(os.path.join(path, "state.pickle"), 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def load(self, path):
+        # Returns False (leaving the engine empty) if there is no usable snapshot
+        state_path = os.path.join(path, "state.pickle")
+        if not os.path.exists(state_path):
+            return False
+        with open(state_path, 'rb') as f:
+            state = pickle.load(f)
+        if state.get("format") != SNAPSHOT_FORMAT:
+            return False
+        matrix = None
+        if state["shape"] is not None:
+            data, indices, indptr = (
+                np.load(os.path.join(path, f"matrix_{name}.npy"), mmap_mode='r')
+                for name in ("data", "indices", "indptr")
+            )
+            matrix = sp.csr_matrix((data, indices, indptr), shape=state["shape"], copy=False)
+        vectorizer = state["vectorizer"]
+        with self._lock:
+            self._docs = state["docs"]
+            self._seq = 0
+            self._doc_seq = {bucket_hash: 0 for bucket_hash in self._docs}
+            self._vectorizer = vectorizer
+            self._matrix = matrix
+            self._row_buckets = state["row_buckets"]
+            self._row_of = {bucket_hash: row for row, bucket_hash in enumerate(self._row_buckets)}
+            self._pending = {
+                bucket_hash: vectorizer.transform([self._docs[bucket_hash]])
+                for bucket_hash in state["pending"]
+                if bucket_hash in self._docs and vectorizer is not None
+            }
+        return True
+
+    def _refit_loop(self):
+        while True:
+            self._wakeup.wait(self.refit_interval)
+            self._wakeup.clear()
+            with self._lock:
+                stale = bool(self._pending) or (self._vectorizer is None and self._docs)
+            if not stale:
+                continue
+            try:
+                self.refit()
+            except Exception as e:
+                print(f"Warning: Similarity index refit failed: {str(e)}")
+
+
+
+def pairwise_similarity(processed_texts):
+    """Cosine similarity (percent) between every pair of texts, fit on the texts themselves."""
+    count = len(processed_texts)
+    if count < 2:
+        return np.zeros((count, count))
+    try:
+        matrix = _tfidf_vectorizer().fit_transform(processed_texts)
+    except ValueError:
+        return np.zeros((count, count))
+    return (matrix @ matrix.T).toarray() * 100
@@ -0,0 +1,48 @@
+# python_service/sqlite_util.py
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+def connect(db_path):
+    # Autocommit mode: writes are grouped explicitly with immediate_transaction()
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class ThreadConnections:
+    """One SQLite (WAL) connection per thread and database file.
+
+    `setup`, if given, is called with each new connection (e.g. to ATTACH
+    another database).
+    """
+
+    def __init__(self, setup=None):
+        self.setup = setup
+        self._local = threading.local()
+
+    def get(self, db_path):
+        connections = getattr(self._local, "connections", None)
+        if connections is None:
+            connections = self._local.connections = {}
+        conn = connections.get(db_path)
+        if conn is None:
+            conn = connections[db_path] = connect(db_path)
+            if self.setup is not None:
+                self.setup(conn)
+        return conn
+
+
+@contextmanager
+def immediate_transaction(conn):
+    # Takes the write lock up front, so read-then-write is atomic across processes
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
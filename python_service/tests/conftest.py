@@ -0,0 +1,6 @@
+# python_service/tests/conftest.py
+import os
+import sys
+
+# The service modules are imported flat, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
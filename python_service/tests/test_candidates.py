@@ -0,0 +1,45 @@
+# python_service/tests/test_candidates.py
+import numpy as np
+
+from corpus_index import CorpusIndex
+from lsh_index import MinHashLSH
+
+
+def make_corpus(count, rng, words=400):
+    vocabulary = [f"w{index}" for index in range(5000)]
+    weights = 1.0 / np.arange(1, len(vocabulary) + 1)
+    weights /= weights.sum()
+    return vocabulary, [list(rng.choice(vocabulary, size=words, p=weights)) for _ in range(count)]
+
+
+def paraphrase(tokens, vocabulary, rng, every=3):
+    # Swapping every third word keeps most of the vocabulary but breaks nearly every 3-shingle
+    tokens = list(tokens)
+    for position in range(0, len(tokens), every):
+        tokens[position] = rng.choice(vocabulary)
+    return tokens
+
+
+def test_token_candidates_find_paraphrased_copies_that_lsh_misses():
+    rng = np.random.default_rng(7)
+    vocabulary, documents = make_corpus(300, rng)
+    corpus = CorpusIndex()
+    lsh = MinHashLSH()
+    for index, tokens in enumerate(documents):
+        corpus.upsert(str(index), f"paper {index}", "0xauthor", tokens)
+        lsh.add(str(index), 0, tokens)
+
+    for source in range(0, 300, 30):
+        query = paraphrase(documents[source], vocabulary, rng)
+        assert str(source) not in dict(lsh.candidates(query, limit=20))
+        ranked = corpus.candidates(query, limit=20, max_tokens=64)
+        assert ranked[0][0] == str(source)
+
+
+def test_candidates_exclude_author_and_limit_lookups():
+    corpus = CorpusIndex()
+    corpus.upsert("a", "one", "0xAuthor (shared)", ["alpha", "beta"])
+    corpus.upsert("b", "two", "0xother", ["alpha"])
+    assert corpus.candidates(["alpha", "beta"], exclude_author="0xauthor") == [("b", 1)]
+    # Only the rarest token ("beta") is looked up
+    assert corpus.candidates(["alpha", "beta"], max_tokens=1) == [("a", 1)]
@@ -0,0 +1,53 @@
+# python_service/tests/test_chain_client.py
+import pytest
+import requests
+
+from chain_client import ChainClient, CircuitBreaker, ChainUnavailable, is_transport_failure
+
+
+def make_client(breaker):
+    # Only call() is exercised, so skip the artifact/web3 set-up
+    client = ChainClient.__new__(ChainClient)
+    client.rpc_url = "http://node"
+    client.breaker = breaker
+    return client
+
+
+def fail_with(error):
+    def fn():
+        raise error
+    return fn
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+def test_transport_failures_are_classified():
+    assert is_transport_failure(requests.exceptions.ConnectionError())
+    assert is_transport_failure(requests.exceptions.ReadTimeout())
+    assert is_transport_failure(http_error(502))
+    assert not is_transport_failure(http_error(400))
+    assert not is_transport_failure(ValueError({"code": -32005, "message": "query returned more than 10000 results"}))
+    assert not is_transport_failure(RuntimeError("execution reverted"))
+
+
+def test_application_errors_do_not_open_the_breaker():
+    client = make_client(CircuitBreaker(failure_threshold=2))
+    for _ in range(5):
+        with pytest.raises(ValueError):
+            client.call(fail_with(ValueError("range too large")))
+    assert client.breaker.state == "closed"
+    assert client.call(lambda: 7) == 7
+
+
+def test_transport_failures_open_the_breaker():
+    client = make_client(CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.ConnectionError):
+            client.call(fail_with(requests.exceptions.ConnectionError()))
+    assert client.breaker.state == "open"
+    with pytest.raises(ChainUnavailable):
+        client.call(lambda: 7)
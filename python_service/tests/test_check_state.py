@@ -0,0 +1,53 @@
+# python_service/tests/test_check_state.py
+import json
+import multiprocessing
+import os
+
+import pytest
+
+from check_state import CheckLimitStore, CheckLogWriter
+
+
+def consume_many(limits_dir, check_key, limit, attempts, results):
+    store = CheckLimitStore(limits_dir)
+    for _ in range(attempts):
+        results.put(store.consume(check_key, limit))
+
+
+def test_consume_is_atomic_across_processes(tmp_path):
+    limits_dir = str(tmp_path / "limits")
+    CheckLimitStore(limits_dir)
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    workers = [
+        context.Process(target=consume_many, args=(limits_dir, "0xauthor:title", 3, 5, results))
+        for _ in range(8)
+    ]
+    for worker in workers:
+        worker.start()
+    outcomes = [results.get(timeout=30) for _ in range(8 * 5)]
+    for worker in workers:
+        worker.join()
+    assert sorted(outcome for outcome in outcomes if outcome is not None) == [0, 1, 2]
+    assert CheckLimitStore(limits_dir).get("0xauthor:title") == 3
+
+
+def test_shard_count_cannot_change(tmp_path):
+    limits_dir = str(tmp_path / "limits")
+    store = CheckLimitStore(limits_dir, shards=4)
+    assert store.consume("key", 3) == 0
+    with pytest.raises(ValueError):
+        CheckLimitStore(limits_dir, shards=8)
+    assert CheckLimitStore(limits_dir, shards=4).get("key") == 1
+
+
+def test_flush_writes_everything_after_short_writes(tmp_path, monkeypatch):
+    writer = CheckLogWriter(str(tmp_path))
+    real_write = os.write
+    # The kernel may accept only part of a large write
+    monkeypatch.setattr(os, "write", lambda fd, data: real_write(fd, bytes(data[:7])))
+    for index in range(20):
+        writer.append({"check": index})
+    writer.flush()
+    with open(writer.path) as f:
+        assert [json.loads(line)["check"] for line in f] == list(range(20))
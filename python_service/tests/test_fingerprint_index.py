@@ -0,0 +1,83 @@
+# python_service/tests/test_fingerprint_index.py
+import random
+
+from fingerprint_index import FingerprintIndex
+
+
+def prose(words, seed):
+    rng = random.Random(seed)
+    return ' '.join(''.join(rng.choice("abcdefghijklmnop") for _ in range(6)) for _ in range(words))
+
+
+def test_fingerprint_offsets_point_into_original_text():
+    index = FingerprintIndex(kgram=10, window=4)
+    text = "The Quick, brown fox -- jumps over the lazy dog; twice over!"
+    for fingerprint, start, end in index.fingerprints(text):
+        span = ''.join(char.lower() for char in text[start:end] if char.isalnum())
+        assert len(span) == 10
+        assert text[start].isalnum() and text[end - 1].isalnum()
+
+
+def test_contiguous_copy_is_one_passage():
+    index = FingerprintIndex(kgram=20, window=10, min_match_chars=50)
+    source = prose(200, seed=1)
+    index.upsert("0xa", source)
+    copied = source[300:900]
+    submission = prose(50, seed=2) + " " + copied + " " + prose(50, seed=3)
+    passages = index.matching_passages(submission)["0xa"]
+    assert len(passages) == 1
+    passage = passages[0]
+    offset = submission.index(copied)
+    assert offset <= passage["submission_start"] and passage["submission_end"] <= offset + len(copied)
+    assert passage["submission_end"] - passage["submission_start"] > 0.9 * len(copied)
+    assert source[passage["source_start"]:passage["source_end"]] == \
+        submission[passage["submission_start"]:passage["submission_end"]]
+
+
+def test_repeated_text_does_not_multiply_passages():
+    index = FingerprintIndex(kgram=20, window=10, min_match_chars=50)
+    unit = prose(12, seed=4) + " "
+    source = unit * 40
+    index.upsert("0xa", source)
+    submission = source[:2000]
+    spans = index.fingerprints(submission)
+    passages = index.matching_passages(submission)["0xa"]
+    assert len(passages) <= len(spans)
+    assert passages[0]["submission_start"] == spans[0][1]
+    assert max(passage["submission_end"] for passage in passages) == spans[-1][2]
+    # The source span follows the copy rather than the first repetition
+    assert passages[0]["source_start"] == passages[0]["submission_start"]
+    assert passages[0]["source_end"] == passages[0]["submission_end"]
+
+
+def test_exclude_and_min_match_chars():
+    index = FingerprintIndex(kgram=20, window=10, min_match_chars=200)
+    source = prose(200, seed=5)
+    index.upsert("0xa", source)
+    index.upsert("0xb", source)
+    assert set(index.matching_passages(source[:1000], exclude=lambda bucket_hash: bucket_hash == "0xb")) == {"0xa"}
+    # A short quotation is below min_match_chars
+    assert index.matching_passages(prose(30, seed=6) + source[:120]) == {}
+
+
+def test_upsert_replaces_previous_version():
+    index = FingerprintIndex(kgram=20, window=10, min_match_chars=50)
+    old = prose(100, seed=7)
+    index.upsert("0xa", old)
+    index.upsert("0xa", prose(100, seed=8))
+    assert index.matching_passages(old) == {}
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "fingerprints.pickle")
+    index = FingerprintIndex(kgram=20, window=10, min_match_chars=50)
+    source = prose(200, seed=9)
+    index.upsert("0xa", source)
+    index.save(path)
+    loaded = FingerprintIndex(kgram=20, window=10, min_match_chars=50)
+    assert loaded.load(path)
+    assert loaded.matching_passages(source) == index.matching_passages(source)
+    # Replacing a loaded paper drops its old fingerprints
+    loaded.upsert("0xa", prose(200, seed=10))
+    assert loaded.matching_passages(source) == {}
+    assert not FingerprintIndex(kgram=30, window=10).load(path)
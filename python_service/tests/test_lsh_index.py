@@ -0,0 +1,60 @@
+# python_service/tests/test_lsh_index.py
+import multiprocessing
+
+from lsh_index import MinHashLSH
+
+
+def tokens_for(bucket_hash, version_index):
+    return [f"{bucket_hash}-{version_index}-{word}" for word in range(30)]
+
+
+def index_of(keys):
+    lsh = MinHashLSH()
+    for bucket_hash, version_index in keys:
+        lsh.add(bucket_hash, version_index, tokens_for(bucket_hash, version_index))
+    return lsh
+
+
+def test_save_load_round_trip(tmp_path):
+    path = str(tmp_path / "lsh_signatures.npz")
+    lsh = index_of([("0xa", 0), ("0xa", 1), ("0xb", 0)])
+    lsh.save(path)
+    loaded = MinHashLSH()
+    assert loaded.load(path) == 3
+    assert loaded.candidates(tokens_for("0xa", 1), limit=1) == [("0xa", 1.0)]
+    assert MinHashLSH(shingle_size=2).load(path) == 0
+
+
+def test_save_keeps_signatures_saved_by_other_processes(tmp_path):
+    path = str(tmp_path / "lsh_signatures.npz")
+    index_of([("0xa", 0), ("0xb", 0)]).save(path)
+    # Another worker that never loaded the file saves its own paper
+    index_of([("0xc", 0), ("0xa", 0)]).save(path)
+    loaded = MinHashLSH()
+    assert loaded.load(path) == 3
+    assert all(key in loaded for key in [("0xa", 0), ("0xb", 0), ("0xc", 0)])
+
+
+def save_repeatedly(path, worker, rounds, errors):
+    failures = 0
+    for round_number in range(rounds):
+        try:
+            index_of([(f"0x{worker}", round_number)]).save(path)
+        except OSError:
+            failures += 1
+    errors.put(failures)
+
+
+def test_concurrent_saves_from_several_processes(tmp_path):
+    path = str(tmp_path / "lsh_signatures.npz")
+    context = multiprocessing.get_context("fork")
+    errors = context.Queue()
+    workers = [context.Process(target=save_repeatedly, args=(path, worker, 20, errors)) for worker in range(3)]
+    for worker in workers:
+        worker.start()
+    failures = [errors.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert failures == [0, 0, 0]
+    assert MinHashLSH().load(path) == 60
+    assert not list(tmp_path.glob("*.tmp"))
@@ -0,0 +1,29 @@
+# python_service/tests/test_metrics.py
+import pytest
+
+from metrics import Metrics
+
+
+def test_counters_and_gauges_render_with_their_type():
+    metrics = Metrics()
+    metrics.counter("plagiarism_preprocess_cache_hits_total", "Token cache hits.", lambda: 12)
+    metrics.gauge("plagiarism_ready", "1 once warm-up has finished.", lambda: True)
+    text = metrics.render()
+    assert "# TYPE plagiarism_preprocess_cache_hits_total counter\nplagiarism_preprocess_cache_hits_total 12.0" in text
+    assert "# TYPE plagiarism_ready gauge\nplagiarism_ready 1.0" in text
+
+
+def test_counter_names_end_in_total():
+    with pytest.raises(ValueError):
+        Metrics().counter("plagiarism_preprocess_cache_hits", "Token cache hits.", lambda: 0)
+
+
+def test_stages_are_kept_apart_by_name():
+    metrics = Metrics()
+    with metrics.stage("check_plagiarism_batch", "batch_preprocess"):
+        pass
+    with metrics.stage("check_plagiarism_batch", "preprocess"):
+        pass
+    totals = metrics.stages.totals()
+    assert totals[("check_plagiarism_batch", "batch_preprocess")][0] == 1
+    assert totals[("check_plagiarism_batch", "preprocess")][0] == 1
@@ -0,0 +1,111 @@
+# python_service/tests/test_paper_store.py
+import sqlite3
+
+import pytest
+
+import paper_store
+from paper_store import DELTA, FULL, PaperStore, apply_delta, encode_delta
+
+
+@pytest.mark.parametrize("base, content", [
+    ("first line\nsecond line\n", "first line\nchanged line\nsecond line\n"),
+    ("no trailing newline\nend", "no trailing newline\nend\n"),
+    ("trailing newline\n", "trailing newline"),
+    ("windows\r\nline endings\r\n", "windows\r\nedited\r\nline endings\r\n"),
+    ("mixed\r\nendings\nhere\r", "mixed\nendings\r\nhere\r\n"),
+    ("page one\x0cpage two same paragraph", "page one\x0cpage three same paragraph"),
+    ("", "from nothing\n"),
+    ("to nothing\n", ""),
+    ("\n\n\n", "\n\n"),
+])
+def test_delta_round_trip(base, content):
+    assert apply_delta(base, encode_delta(base, content)) == content
+
+
+def version_text(index):
+    lines = [f"line {line} of the paper" for line in range(40)]
+    lines[index % 40] = f"revised in version {index}"
+    # CRLF text, with and without a trailing newline
+    return "\r\n".join(lines) + ("\r\n" if index % 2 else "")
+
+
+def test_get_versions_rebuilds_across_snapshots(tmp_path):
+    store = PaperStore(str(tmp_path / "papers.db"), snapshot_interval=4)
+    store.store_paper("0xpaper", "title", version_text(0), "0xauthor", timestamp=100)
+    for index in range(1, 11):
+        store.add_version("0xpaper", version_text(index), timestamp=100 + index)
+
+    kinds = [row[0] for row in store._connection().execute(
+        "SELECT kind FROM versions WHERE bucket_hash = ? ORDER BY version_index", ("0xpaper",)
+    )]
+    assert [index for index, kind in enumerate(kinds) if kind == FULL] == [0, 4, 8]
+    assert DELTA in kinds
+
+    for start in range(11):
+        for end in range(start, 12):
+            versions = store.get_versions("0xpaper", start, end)
+            assert [version["version_index"] for version in versions] == list(range(start, min(end, 11)))
+            assert [version["content"] for version in versions] == [version_text(index) for index in range(start, min(end, 11))]
+            assert [version["timestamp"] for version in versions] == [100 + index for index in range(start, min(end, 11))]
+    assert store.get_paper("0xpaper", start=-1)["content"] == version_text(10)
+
+
+def test_migrates_v1_inline_versions(tmp_path):
+    db_path = str(tmp_path / "papers.db")
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE papers (bucket_hash TEXT PRIMARY KEY, title TEXT NOT NULL, author_address TEXT NOT NULL,
+                             version_count INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE versions (bucket_hash TEXT NOT NULL, version_index INTEGER NOT NULL, content TEXT NOT NULL,
+                               timestamp INTEGER NOT NULL DEFAULT 0, PRIMARY KEY (bucket_hash, version_index)) WITHOUT ROWID;
+    """)
+    conn.execute("INSERT INTO papers VALUES ('0xa', 'first', '0xauthor', 3)")
+    conn.execute("INSERT INTO papers VALUES ('0xb', 'second', '0xother', 1)")
+    for index in range(3):
+        conn.execute("INSERT INTO versions VALUES ('0xa', ?, ?, ?)", (index, version_text(index), index))
+    conn.execute("INSERT INTO versions VALUES ('0xb', 0, 'only version\r\n', 7)")
+    conn.commit()
+    conn.close()
+
+    store = PaperStore(db_path)
+    paper = store.get_paper("0xa", start=0)
+    assert [version["content"] for version in paper["versions"]] == [version_text(index) for index in range(3)]
+    assert paper["content"] == version_text(2)
+    assert store.get_paper("0xb", start=0)["versions"] == [{"version_index": 0, "content": "only version\r\n", "timestamp": 7}]
+    conn = store._connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == paper_store.SCHEMA_VERSION
+    assert conn.execute("SELECT COUNT(*) FROM sqlite_master WHERE name = 'versions_v1'").fetchone()[0] == 0
+    # Opening it again is a no-op
+    assert PaperStore(db_path).version_counts() == {"0xa": 3, "0xb": 1}
+
+
+def test_add_version_rediffs_when_another_writer_got_in_first(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "papers.db")
+    store = PaperStore(db_path)
+    other = PaperStore(db_path)
+    store.store_paper("0xpaper", "title", version_text(0), "0xauthor")
+    encode = store._encode
+    calls = []
+
+    def encode_then_race(version_index, content, previous):
+        calls.append(version_index)
+        if len(calls) == 1:
+            # Another process appends while this one is still diffing outside the lock
+            other.add_version("0xpaper", version_text(1))
+        return encode(version_index, content, previous)
+
+    monkeypatch.setattr(store, "_encode", encode_then_race)
+    assert store.add_version("0xpaper", version_text(2)) == 2
+    assert calls == [1, 2]
+    versions = store.get_versions("0xpaper", 0, 3)
+    assert [version["content"] for version in versions] == [version_text(index) for index in range(3)]
+
+
+def test_data_version_changes_on_other_writers_commits(tmp_path):
+    db_path = str(tmp_path / "papers.db")
+    reader = PaperStore(db_path)
+    writer = PaperStore(db_path)
+    before = reader.data_version()
+    assert reader.data_version() == before
+    writer.store_paper("0xpaper", "title", "content\n", "0xauthor")
+    assert reader.data_version() != before
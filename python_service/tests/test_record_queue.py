@@ -0,0 +1,139 @@
+# python_service/tests/test_record_queue.py
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("web3")
+
+from web3 import Web3
+from web3.exceptions import TransactionNotFound
+
+from chain_client import ChainClient, CircuitBreaker
+from record_queue import RecordCheckQueue
+
+AUTHOR = "0x477d1a04263c98ecc5b4482d2fe24fa6f5d59a5d"
+
+
+class StubEth:
+    """Node stub whose transactions stay pending for `pending_polls` receipt lookups."""
+
+    def __init__(self, pending_polls=2):
+        self.accounts = ["0x00000000000000000000000000000000000000aa"]
+        self.pending_polls = pending_polls
+        self.sent = []
+        # Broadcasts that are accepted but then reported as a timeout
+        self.lost_answers = 0
+
+    def get_transaction_count(self, sender, block):
+        return 7 + len(self.sent)
+
+    def sign_transaction(self, transaction):
+        return {"raw": json.dumps(transaction).encode(), "tx": transaction}
+
+    def send_raw_transaction(self, raw_tx):
+        transaction = json.loads(raw_tx)
+        if transaction in self.sent:
+            raise ValueError({"code": -32000, "message": "already known"})
+        self.sent.append(transaction)
+        if self.lost_answers:
+            self.lost_answers -= 1
+            raise TimeoutError("Read timed out")
+        return Web3.keccak(raw_tx)
+
+    def get_transaction_receipt(self, tx_hash):
+        if self.pending_polls:
+            self.pending_polls -= 1
+            raise TransactionNotFound(f"Transaction with hash {tx_hash} not found")
+        return {"status": 1, "blockNumber": 42}
+
+
+def make_chain(eth):
+    client = ChainClient.__new__(ChainClient)
+    client.rpc_url = "http://node"
+    client.breaker = CircuitBreaker(failure_threshold=1)
+    client.w3 = SimpleNamespace(eth=eth)
+    client.invalidated = []
+    client.invalidate_author = client.invalidated.append
+    record_check = lambda author, similarity: SimpleNamespace(
+        build_transaction=lambda params: dict(params, to="checker", data=[author, similarity])
+    )
+    client.contract = SimpleNamespace(functions=SimpleNamespace(recordCheck=record_check))
+    return client
+
+
+def test_receipts_are_shared_and_only_one_process_sends(tmp_path):
+    eth = StubEth(pending_polls=0)
+    db_path = str(tmp_path / "record_queue.db")
+    first = RecordCheckQueue(make_chain(eth), db_path)
+    second = RecordCheckQueue(make_chain(eth), db_path)
+
+    receipt_id = second.submit(AUTHOR, 87.6)
+    assert first.status(receipt_id)["status"] == "queued"
+    assert first.run_once()
+    # The lock is taken, so the other worker does not send (and cannot reuse nonces)
+    assert not second.run_once()
+    assert second.status(receipt_id)["status"] == "submitted"
+    first.run_once()
+    receipt = second.status(receipt_id)
+    assert (receipt["status"], receipt["block_number"], receipt["similarity"]) == ("confirmed", 42, 88)
+    assert [transaction["nonce"] for transaction in eth.sent] == [7]
+
+
+def test_pending_receipts_do_not_trip_any_breaker(tmp_path):
+    eth = StubEth(pending_polls=2)
+    chain = make_chain(eth)
+    queue = RecordCheckQueue(chain, str(tmp_path / "record_queue.db"))
+    receipt_ids = [queue.submit(AUTHOR, 90), queue.submit(AUTHOR, 95)]
+    queue.run_once()
+    queue.run_once()
+    assert chain.breaker.state == "closed"
+    assert queue.breaker.state == "closed"
+    assert [queue.status(receipt_id)["status"] for receipt_id in receipt_ids] == ["submitted", "submitted"]
+    queue.run_once()
+    assert [queue.status(receipt_id)["status"] for receipt_id in receipt_ids] == ["confirmed", "confirmed"]
+    assert [transaction["nonce"] for transaction in eth.sent] == [7, 8]
+    assert chain.invalidated == [AUTHOR, AUTHOR]
+
+
+def test_retry_rebroadcasts_the_same_transaction(tmp_path):
+    eth = StubEth(pending_polls=0)
+    eth.lost_answers = 1
+    queue = RecordCheckQueue(make_chain(eth), str(tmp_path / "record_queue.db"), backoff=0)
+    receipt_id = queue.submit(AUTHOR, 90)
+    # The node took the transaction but the answer timed out
+    queue.run_once()
+    assert queue.status(receipt_id)["status"] == "queued"
+    queue.run_once()
+    queue.run_once()
+    receipt = queue.status(receipt_id)
+    assert receipt["status"] == "confirmed"
+    assert receipt["tx_hash"] == Web3.to_hex(Web3.keccak(json.dumps(eth.sent[0]).encode()))
+    assert [transaction["nonce"] for transaction in eth.sent] == [7]
+
+
+def test_transaction_signed_before_a_crash_is_resent_unchanged(tmp_path):
+    eth = StubEth(pending_polls=0)
+    db_path = str(tmp_path / "record_queue.db")
+    crashed = RecordCheckQueue(make_chain(eth), db_path)
+    receipt_id = crashed.submit(AUTHOR, 90)
+    crashed.sender = eth.accounts[0]
+    signed = crashed._sign(receipt_id, AUTHOR, 90)
+    crashed.submit(AUTHOR, 95)
+
+    queue = RecordCheckQueue(make_chain(eth), db_path)
+    queue.run_once()
+    queue.run_once()
+    assert queue.status(receipt_id)["tx_hash"] == signed["tx_hash"]
+    assert queue.status(receipt_id)["status"] == "confirmed"
+    assert [transaction["nonce"] for transaction in eth.sent] == [7, 8]
+
+
+def test_unconfirmed_transaction_fails_after_confirm_timeout(tmp_path):
+    eth = StubEth(pending_polls=100)
+    queue = RecordCheckQueue(make_chain(eth), str(tmp_path / "record_queue.db"), confirm_timeout=0)
+    receipt_id = queue.submit(AUTHOR, 90)
+    queue.run_once()
+    queue.run_once()
+    receipt = queue.status(receipt_id)
+    assert receipt["status"] == "failed" and "never mined" in receipt["error"]
@@ -0,0 +1,44 @@
+# python_service/tests/test_registry_index.py
+from types import SimpleNamespace
+
+from chain_client import ChainClient, CircuitBreaker
+from registry_index import RegistryIndex
+
+
+class RangeLimitedEth:
+    """Node stub that rejects log queries spanning more than `max_span` blocks."""
+
+    def __init__(self, head, max_span):
+        self.block_number = head
+        self.max_span = max_span
+        self.queries = []
+
+    def get_logs(self, params):
+        span = params["toBlock"] - params["fromBlock"] + 1
+        self.queries.append(span)
+        if span > self.max_span:
+            raise ValueError({"code": -32005, "message": "query returned more than 10000 results"})
+        return []
+
+
+def make_index(tmp_path, eth):
+    w3 = SimpleNamespace(eth=eth, keccak=lambda text: text.encode(), to_hex=lambda value: value.hex())
+    client = ChainClient.__new__(ChainClient)
+    client.rpc_url = "http://node"
+    client.breaker = CircuitBreaker(failure_threshold=3)
+    client.w3 = w3
+    contract = SimpleNamespace(address="0xregistry", w3=w3)
+    return RegistryIndex(str(tmp_path / "registry.db"), contract, client, batch_blocks=2000), client
+
+
+def test_range_errors_split_without_opening_any_breaker(tmp_path):
+    eth = RangeLimitedEth(head=5000, max_span=100)
+    index, client = make_index(tmp_path, eth)
+    while index.sync_once():
+        pass
+    assert index.checkpoint() == 5000
+    assert client.breaker.state == "closed"
+    assert index.breaker.state == "closed"
+    # Later batches stay within the span the node accepted
+    assert index.batch_blocks <= 100
+    assert eth.queries[-1] <= 100
@@ -0,0 +1,48 @@
+# python_service/tests/test_similarity_engine.py
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+
+from similarity_engine import SimilarityEngine
+
+
+def make_engine(rng, count=60):
+    vocabulary = [f"term{chr(97 + index % 26)}{chr(97 + index // 26)}" for index in range(400)]
+    engine = SimilarityEngine()
+    for index in range(count):
+        engine.upsert(f"0x{index:02x}", ' '.join(rng.choice(vocabulary, size=80)))
+    engine.refit()
+    # Stored after the fit: scored from the pending rows
+    for index in range(count, count + 5):
+        engine.upsert(f"0x{index:02x}", ' '.join(rng.choice(vocabulary, size=80)))
+    return engine, vocabulary
+
+
+def test_top_k_many_matches_top_k_per_submission():
+    rng = np.random.default_rng(3)
+    engine, vocabulary = make_engine(rng)
+    queries = [' '.join(rng.choice(vocabulary, size=60)) for _ in range(7)]
+    excludes = [None, lambda bucket_hash: bucket_hash < "0x20"] * 3 + [None]
+    candidates = [None, None, {"0x01", "0x02", "0x3e", "0x40"}, None, None, None, None]
+
+    batched = engine.top_k_many(queries, k=5, excludes=excludes, candidates=candidates, chunk_size=2)
+
+    for query, exclude, candidate_set, result in zip(queries, excludes, candidates, batched):
+        expected = engine.top_k(query, k=5, exclude=exclude, candidates=candidate_set)
+        assert [bucket_hash for bucket_hash, _ in result] == [bucket_hash for bucket_hash, _ in expected]
+        assert np.allclose([score for _, score in result], [score for _, score in expected])
+    assert {bucket_hash for bucket_hash, _ in batched[2]} <= candidates[2]
+
+
+def test_top_k_many_ranks_past_excluded_papers():
+    rng = np.random.default_rng(4)
+    engine, vocabulary = make_engine(rng)
+    query = ' '.join(rng.choice(vocabulary, size=60))
+    # Excluding the best matches exhausts the per-row headroom
+    best = {bucket_hash for bucket_hash, _ in engine.top_k(query, k=20)}
+    exclude = lambda bucket_hash: bucket_hash in best
+    batched = engine.top_k_many([query], k=5, excludes=[exclude])[0]
+    expected = engine.top_k(query, k=5, exclude=exclude)
+    assert [bucket_hash for bucket_hash, _ in batched] == [bucket_hash for bucket_hash, _ in expected]
+    assert np.allclose([score for _, score in batched], [score for _, score in expected])
@@ -0,0 +1,31 @@
+# python_service/tests/test_text_processing.py
+from text_processing import TextPipeline
+
+
+def test_tokenize_strips_punctuation_digits_and_stopwords():
+    pipeline = TextPipeline(stopwords={"the", "of"})
+    assert pipeline.tokenize("The 3 Laws of Motion, revisited!") == ("laws", "motion", "revisited")
+
+
+def test_cache_is_bounded_by_total_tokens():
+    pipeline = TextPipeline(stopwords=(), cache_tokens=12)
+    short = "one two"
+    pipeline.tokens(short)
+    # 10 tokens (plus one per entry) push the short text out
+    pipeline.tokens(" ".join(f"word{number}" for number in range(10)))
+    assert pipeline._cached_tokens <= 12
+    pipeline.tokens(short)
+    assert (pipeline.hits, pipeline.misses) == (0, 3)
+    # Longer than the whole budget: tokenized but never cached
+    long_text = " ".join(["word"] * 50)
+    pipeline.tokens(long_text)
+    pipeline.tokens(long_text)
+    assert pipeline.hits == 0
+
+
+def test_tokens_many_serves_hits_and_dedupes_misses():
+    pipeline = TextPipeline(stopwords=())
+    pipeline.tokens("alpha beta")
+    results = pipeline.tokens_many(["alpha beta", "gamma", "gamma"])
+    assert results == [("alpha", "beta"), ("gamma",), ("gamma",)]
+    assert pipeline.hits == 1
@@ -0,0 +1,101 @@
+# python_service/tests/test_warm_snapshot.py
+import multiprocessing
+
+import pytest
+
+pytest.importorskip("sklearn")
+
+from corpus_index import CorpusIndex
+from fingerprint_index import FingerprintIndex
+from similarity_engine import SimilarityEngine
+from warm_snapshot import WarmSnapshot, stale_buckets
+
+PAPERS = {
+    "0xa": "graph neural networks learn node embeddings from neighbourhood aggregation " * 4,
+    "0xb": "blockchain registries record ownership of academic manuscripts immutably " * 4,
+    "0xc": "winnowing selects minimum hashes from sliding windows over character kgrams " * 4,
+}
+
+
+def build_indexes(fit=True):
+    engine, corpus, fingerprints = SimilarityEngine(), CorpusIndex(), FingerprintIndex()
+    for bucket_hash, content in PAPERS.items():
+        tokens = content.split()
+        corpus.upsert(bucket_hash, f"title {bucket_hash}", "0xAuthor", tokens)
+        engine.upsert(bucket_hash, ' '.join(tokens))
+        fingerprints.upsert(bucket_hash, content)
+    if fit:
+        engine.refit()
+    return engine, corpus, fingerprints
+
+
+def test_round_trip_restores_every_index(tmp_path):
+    snapshot = WarmSnapshot(str(tmp_path / "warm"))
+    engine, corpus, fingerprints = build_indexes()
+    watermark = {"0xa": 1, "0xb": 2, "0xc": 1}
+    assert snapshot.save(watermark, engine, corpus, fingerprints) == 3
+
+    loaded = SimilarityEngine(), CorpusIndex(), FingerprintIndex()
+    assert snapshot.load(*loaded) == watermark
+    engine_copy, corpus_copy, fingerprints_copy = loaded
+    query = PAPERS["0xb"][:200]
+    assert engine_copy.top_k(query, k=2) == engine.top_k(query, k=2)
+    assert corpus_copy.find_by_title("TITLE 0xc") == corpus.find_by_title("title 0xc")
+    assert fingerprints_copy.matching_passages(query) == fingerprints.matching_passages(query)
+    assert not list(tmp_path.glob("warm.*.tmp"))
+
+
+def test_missing_or_mismatched_snapshot_is_ignored(tmp_path):
+    snapshot = WarmSnapshot(str(tmp_path / "warm"))
+    assert snapshot.load(SimilarityEngine(), CorpusIndex(), FingerprintIndex()) is None
+    snapshot.save({"0xa": 1}, *build_indexes())
+    assert snapshot.load(SimilarityEngine(), CorpusIndex(), FingerprintIndex(kgram=30)) is None
+
+
+def test_unfitted_snapshot_loads_unfitted(tmp_path):
+    # app.load_corpus refits in this case before reporting ready
+    snapshot = WarmSnapshot(str(tmp_path / "warm"))
+    snapshot.save({"0xa": 1}, *build_indexes(fit=False))
+    engine = SimilarityEngine()
+    assert snapshot.load(engine, CorpusIndex(), FingerprintIndex()) == {"0xa": 1}
+    assert not engine.fitted()
+    engine.refit()
+    assert engine.fitted()
+    assert engine.top_k(PAPERS["0xa"], k=1)[0][0] == "0xa"
+
+
+def test_stale_buckets():
+    watermark = {"0xa": 2, "0xb": 1}
+    version_counts = {"0xa": 2, "0xb": 3, "0xc": 1}
+    assert sorted(stale_buckets(watermark, version_counts)) == ["0xb", "0xc"]
+    assert stale_buckets(version_counts, version_counts) == []
+
+
+def save_and_load_repeatedly(snapshot_dir, rounds, errors):
+    snapshot = WarmSnapshot(snapshot_dir)
+    indexes = build_indexes()
+    failures = 0
+    for _ in range(rounds):
+        try:
+            snapshot.save({"0xa": 1, "0xb": 1, "0xc": 1}, *indexes)
+            if snapshot.load(SimilarityEngine(), CorpusIndex(), FingerprintIndex()) is None:
+                failures += 1
+        except OSError:
+            failures += 1
+    errors.put(failures)
+
+
+def test_concurrent_saves_from_several_processes(tmp_path):
+    snapshot_dir = str(tmp_path / "warm")
+    context = multiprocessing.get_context("fork")
+    errors = context.Queue()
+    workers = [
+        context.Process(target=save_and_load_repeatedly, args=(snapshot_dir, 25, errors)) for _ in range(3)
+    ]
+    for worker in workers:
+        worker.start()
+    failures = [errors.get(timeout=120) for _ in workers]
+    for worker in workers:
+        worker.join()
+    assert failures == [0, 0, 0]
+    assert WarmSnapshot(snapshot_dir).load(SimilarityEngine(), CorpusIndex(), FingerprintIndex()) is not None
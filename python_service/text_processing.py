@@ -0,0 +1,148 @@
+# python_service/text_processing.py
+import hashlib
+import multiprocessing
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# Vendored NLTK data, so workers start without network access
+NLTK_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'nltk_data')
+
+# Punctuation and digits are both plain deletions, so one pass removes both
+_STRIP_PATTERN = re.compile(r'[^\w\s]|\d+')
+
+# Pipeline used inside process-pool workers, set up by _init_worker
+_worker_pipeline = None
+
+
+def load_stopwords(language='english', offline=False):
+    # The vendored list is read directly; nltk is only imported if it is missing
+    path = os.path.join(NLTK_DATA_DIR, 'corpora', 'stopwords', language)
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return frozenset(line.strip() for line in f if line.strip())
+    import nltk
+    if NLTK_DATA_DIR not in nltk.data.path:
+        nltk.data.path.insert(0, NLTK_DATA_DIR)
+    try:
+        return frozenset(nltk.corpus.stopwords.words(language))
+    except LookupError:
+        if offline:
+            raise
+        nltk.download('stopwords', quiet=True)
+        return frozenset(nltk.corpus.stopwords.words(language))
+
+
+def _init_worker(stopwords):
+    global _worker_pipeline
+    _worker_pipeline = TextPipeline(stopwords=stopwords, cache_tokens=0)
+
+
+def _tokenize_in_worker(text):
+    return _worker_pipeline.tokenize(text)
+
+
+class TextPipeline:
+    """Reusable preprocessing: lowercase, strip punctuation/digits, drop stopwords.
+
+    After stripping, the text is only word characters and whitespace, so a
+    whitespace split gives the same tokens as nltk.word_tokenize without the
+    Punkt models; the only difference is Treebank's splitting of a few
+    colloquial words ("cannot" -> "can not", "gonna" -> "gon na"). Results
+    are kept in an LRU cache keyed by a hash of the raw text, so each
+    stored version is tokenized once rather than on every check. The cache
+    holds at most `cache_tokens` tokens in total, however long the papers.
+    """
+
+    def __init__(self, stopwords=None, cache_tokens=1000000, offline=False):
+        self._stopwords = frozenset(stopwords) if stopwords is not None else None
+        self.cache_tokens = cache_tokens
+        self.offline = offline
+        self._cache = OrderedDict()
+        self._cached_tokens = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def stopwords(self):
+        if self._stopwords is None:
+            self._stopwords = load_stopwords('english', offline=self.offline)
+        return self._stopwords
+
+    def tokens(self, text):
+        key = self._key(text)
+        cached = self._lookup(key)
+        if cached is not None:
+            return cached
+        tokens = self.tokenize(text)
+        self._remember(key, tokens)
+        return tokens
+
+    def tokens_many(self, texts, executor=None, chunksize=8):
+        # Cache hits are served here; misses are tokenized on the executor if given
+        keys = [self._key(text) for text in texts]
+        results = [self._lookup(key) for key in keys]
+        misses = {}
+        for position, key in enumerate(keys):
+            if results[position] is None:
+                misses.setdefault(key, []).append(position)
+        miss_texts = [texts[positions[0]] for positions in misses.values()]
+        if executor is None:
+            tokenized = map(self.tokenize, miss_texts)
+        else:
+            tokenized = executor.map(_tokenize_in_worker, miss_texts, chunksize=chunksize)
+        for (key, positions), tokens in zip(misses.items(), tokenized):
+            self._remember(key, tokens)
+            for position in positions:
+                results[position] = tokens
+        return results
+
+    def create_pool(self, max_workers=None):
+        # Workers come from a fork server, not a fork of this (threaded) process
+        return ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("forkserver"),
+            initializer=_init_worker,
+            initargs=(tuple(self.stopwords),)
+        )
+
+    def tokenize(self, text):
+        stopwords = self.stopwords
+        return tuple(
+            token for token in _STRIP_PATTERN.sub('', text.lower()).split()
+            if token not in stopwords
+        )
+
+    def process(self, text):
+        return ' '.join(self.tokens(text))
+
+    def _key(self, text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def _lookup(self, key):
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return cached
+
+    def _remember(self, key, tokens):
+        # Every entry counts at least one token, so empty results stay bounded too
+        cost = len(tokens) + 1
+        if cost > self.cache_tokens:
+            return
+        with self._lock:
+            previous = self._cache.pop(key, None)
+            if previous is not None:
+                self._cached_tokens -= len(previous) + 1
+            self._cache[key] = tokens
+            self._cached_tokens += cost
+            while self._cached_tokens > self.cache_tokens:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_tokens -= len(evicted) + 1
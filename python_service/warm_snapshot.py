@@ -0,0 +1,86 @@
+# python_service/warm_snapshot.py
+import fcntl
+import json
+import os
+import shutil
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+
+def stale_buckets(watermark, version_counts):
+    # Buckets with versions the watermark ({bucket_hash: version_count}) does not cover
+    return [
+        bucket_hash for bucket_hash, count in version_counts.items()
+        if watermark.get(bucket_hash, 0) < count
+    ]
+
+
+class WarmSnapshot:
+    """Corpus, TF-IDF and fingerprint indexes saved to `snapshot_dir`.
+
+    Every worker process may save. A save is written to a directory of its
+    own and only swapped into place under an exclusive flock on
+    `<snapshot_dir>.lock`; loads hold the same lock shared, so concurrent
+    savers never trip over each other's renames and a reader never sees a
+    half-replaced snapshot. The manifest carries the watermark: the version
+    count of every paper the snapshot reflects.
+    """
+
+    def __init__(self, snapshot_dir):
+        self.snapshot_dir = snapshot_dir
+        self.lock_path = f"{snapshot_dir}.lock"
+        self._save_lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self, mode):
+        os.makedirs(os.path.dirname(os.path.abspath(self.snapshot_dir)), exist_ok=True)
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, mode)
+            yield
+        finally:
+            # Closing the descriptor releases the lock
+            os.close(fd)
+
+    def save(self, watermark, similarity_engine, corpus_index, fingerprint_index):
+        """Write a snapshot; `watermark` must be taken before the indexes are copied."""
+        with self._save_lock:
+            tmp_dir = f"{self.snapshot_dir}.{os.getpid()}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            try:
+                os.makedirs(tmp_dir)
+                similarity_engine.save(os.path.join(tmp_dir, 'similarity'))
+                corpus_index.save(os.path.join(tmp_dir, 'corpus_index.pickle'))
+                fingerprint_index.save(os.path.join(tmp_dir, 'fingerprints.pickle'))
+                with open(os.path.join(tmp_dir, 'manifest.json'), 'w') as f:
+                    json.dump({"created_at": datetime.now().isoformat(), "version_counts": watermark}, f)
+                with self._locked(fcntl.LOCK_EX):
+                    old_dir = f"{self.snapshot_dir}.old"
+                    shutil.rmtree(old_dir, ignore_errors=True)
+                    if os.path.exists(self.snapshot_dir):
+                        os.replace(self.snapshot_dir, old_dir)
+                    os.replace(tmp_dir, self.snapshot_dir)
+                    shutil.rmtree(old_dir, ignore_errors=True)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+        return len(watermark)
+
+    def load(self, similarity_engine, corpus_index, fingerprint_index):
+        # Returns the watermark, or None if there is no usable snapshot
+        with self._locked(fcntl.LOCK_SH):
+            manifest_path = os.path.join(self.snapshot_dir, 'manifest.json')
+            if not os.path.exists(manifest_path):
+                return None
+            try:
+                with open(manifest_path, 'r') as f:
+                    watermark = json.load(f)["version_counts"]
+                if not (similarity_engine.load(os.path.join(self.snapshot_dir, 'similarity'))
+                        and fingerprint_index.load(os.path.join(self.snapshot_dir, 'fingerprints.pickle'))):
+                    print(f"Warning: Ignoring warm snapshot in {self.snapshot_dir} built with different parameters")
+                    return None
+                corpus_index.load(os.path.join(self.snapshot_dir, 'corpus_index.pickle'))
+            except Exception as e:
+                print(f"Warning: Could not load warm snapshot: {str(e)}")
+                return None
+        return watermark